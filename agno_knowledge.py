@@ -1,14 +1,230 @@
 """Agno-compatible knowledge base implementation with ChromaDB."""
 
+import hashlib
+import json
 import logging
-import uuid
-from typing import List, Dict, Any, Optional
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Callable, Set
 import chromadb
 from chromadb.config import Settings as ChromaSettings
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
+from embedding_cache import EmbeddingCache
+from chunking import CHUNKING_MODES, Chunker
+from parallel_chunking import ParallelChunker
+from query_batcher import QueryEmbeddingBatcher
+from query_cache import TTLCache, normalize_query
+from search_filters import filter_key
+from scoring import HNSW_SPACES, SCORE_FROM_DISTANCE
+from numpy_store import NumpyVectorStore
+from bm25_index import BM25Index
 
 logger = logging.getLogger(__name__)
 
+# Fields a search result can be projected onto, and the Chroma include entry behind each
+SEARCH_FIELDS = ("ids", "scores", "metadata", "content")
+VECTOR_BACKENDS = ("chroma", "numpy")
+_CHROMA_INCLUDE = {"scores": "distances", "metadata": "metadatas", "content": "documents"}
+
+# Upper bound on the characters of one token window, for cutting unbroken streamed text
+_MAX_CHARS_PER_TOKEN = 16
+
+# HNSW settings Chroma lets us change on an existing collection
+_MUTABLE_HNSW = ("ef_search", "sync_threshold")
+
+
+def _no_progress(stage: str, count: int):
+    """Default ingest progress callback."""
+
+
+class IngestTimings:
+    """Cumulative wall time spent in each ingest stage, for stats and benchmarks."""
+    
+    STAGES = ("chunking", "lookup", "embedding", "writing", "lexical")
+    
+    def __init__(self):
+        """Initialize all stages at zero."""
+        self._lock = threading.Lock()
+        self.reset()
+    
+    @contextmanager
+    def measure(self, stage: str):
+        """Add the wall time of the with-block to stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._seconds[stage] += elapsed
+    
+    def snapshot(self) -> Dict[str, float]:
+        """Seconds spent per stage so far."""
+        with self._lock:
+            return dict(self._seconds)
+    
+    def reset(self):
+        """Zero all stages."""
+        with self._lock:
+            self._seconds = {stage: 0.0 for stage in self.STAGES}
+
+
+class _ChunkBatcher:
+    """Buffers chunks and embeds and writes them in batches, skipping ids already stored."""
+    
+    def __init__(self, knowledge_base: "AgnoRAGKnowledgeBase", flush_size: int, progress: Optional[Callable[[str, int], None]] = None):
+        """Initialize an empty batch buffer."""
+        self.knowledge_base = knowledge_base
+        self.flush_size = flush_size
+        self.progress = progress or _no_progress
+        self.ids: List[str] = []
+        self.chunks: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.token_ids: List[Optional[List[int]]] = []
+    
+    def add(
+        self,
+        ids: List[str],
+        chunks: List[str],
+        metadatas: List[Dict[str, Any]],
+        token_ids: Optional[List[Optional[List[int]]]] = None
+    ):
+        """Queue chunks, flushing full batches as the buffer fills."""
+        self.progress("chunked", len(ids))
+        self.ids.extend(ids)
+        self.chunks.extend(chunks)
+        self.metadatas.extend(metadatas)
+        self.token_ids.extend(token_ids or [None] * len(ids))
+        
+        while len(self.ids) >= self.flush_size:
+            self._flush(self.flush_size)
+    
+    def flush(self):
+        """Embed and write everything still buffered."""
+        if self.ids:
+            self._flush(len(self.ids))
+    
+    def discard(self):
+        """Drop everything still buffered without writing it."""
+        del self.ids[:], self.chunks[:], self.metadatas[:], self.token_ids[:]
+    
+    def _flush(self, count: int):
+        """Embed and write the first count buffered chunks that are not stored yet."""
+        kb = self.knowledge_base
+        seen = kb._existing_ids(list(dict.fromkeys(self.ids[:count])))
+        new = []
+        for i in range(count):
+            if self.ids[i] not in seen:
+                seen.add(self.ids[i])
+                new.append(i)
+        self.progress("skipped", count - len(new))
+        
+        if new:
+            new_ids = [self.ids[i] for i in new]
+            new_chunks = [self.chunks[i] for i in new]
+            new_metadatas = [self.metadatas[i] for i in new]
+            embeddings = kb._embed_chunks(new_chunks, [self.token_ids[i] for i in new])
+            self.progress("embedded", len(new))
+            kb._write_chunks(new_ids, embeddings, new_chunks, new_metadatas)
+            self.progress("written", len(new))
+        del self.ids[:count], self.chunks[:count], self.metadatas[:count], self.token_ids[:count]
+
+
+class TextStreamIngest:
+    """Incrementally chunks, embeds and writes one document fed in pieces.
+    
+    Only the unchunked tail of the text and one embedding batch are held in
+    memory, so peak memory depends on the block and batch sizes rather than
+    on the size of the document; chunk ids are not collected either, only
+    counted. Because the totals are unknown while streaming, chunk metadata
+    carries ``chunk_index`` and ``streamed`` but not ``total_chunks`` or
+    ``original_doc_length``.
+    
+    In token mode the chunker only stops at whitespace while text is still
+    arriving, so text without any (minified code, base64) would pile up in
+    the buffer and be re-tokenized on every block. Once the buffer holds
+    more than one window plus the block just fed, it is chunked as if the
+    document ended there; the next window still overlaps the cut.
+    """
+    
+    def __init__(self, knowledge_base: "AgnoRAGKnowledgeBase", metadata: Dict[str, Any], progress: Optional[Callable[[str, int], None]] = None):
+        """Initialize an empty stream."""
+        self.knowledge_base = knowledge_base
+        self.metadata = metadata
+        self.batcher = _ChunkBatcher(knowledge_base, knowledge_base.embedding_batch_size, progress)
+        self.buffer = ""
+        self.buffer_offset = 0
+        self.chunks_created = 0
+        self.chars_read = 0
+        chunker = knowledge_base.chunker
+        if chunker.chunking_mode == "tokens":
+            self.window_chars = chunker.max_tokens * _MAX_CHARS_PER_TOKEN
+        else:
+            self.window_chars = chunker.chunk_size
+    
+    def feed(self, text: str):
+        """Append text and ingest every chunk whose boundaries are now known."""
+        self.buffer += text
+        self.chars_read += len(text)
+        
+        resume = 0
+        for start, end, token_ids, resume in self.knowledge_base.chunker.iter_chunks(self.buffer, final=False):
+            self._emit(start, end, token_ids)
+        self.buffer = self.buffer[resume:]
+        self.buffer_offset += resume
+        
+        if len(self.buffer) > self.window_chars + len(text):
+            self._cut()
+    
+    def _cut(self):
+        """Chunk the whole buffer as if the document ended there, keeping the overlap of the last window."""
+        resume = len(self.buffer)
+        for start, end, token_ids, resume in self.knowledge_base.chunker.iter_chunks(self.buffer, final=True):
+            self._emit(start, end, token_ids)
+        self.buffer = self.buffer[resume:]
+        self.buffer_offset += resume
+    
+    def close(self) -> int:
+        """Ingest the remaining text and return the number of chunks created."""
+        for start, end, token_ids, _ in self.knowledge_base.chunker.iter_chunks(self.buffer, final=True):
+            self._emit(start, end, token_ids)
+        if self.chunks_created == 0:
+            # Keep a record for empty documents, as add_text_document does
+            self._emit(0, len(self.buffer), force=True)
+        self.buffer = ""
+        self.batcher.flush()
+        return self.chunks_created
+    
+    def abort(self):
+        """Stop the ingest, dropping unchunked text and the batch not yet written.
+        
+        Chunks already flushed stay stored; their ids are deterministic, so
+        feeding the same document again skips them and writes only the rest.
+        """
+        self.buffer = ""
+        self.batcher.discard()
+    
+    def _emit(self, start: int, end: int, token_ids: Optional[List[int]] = None, force: bool = False):
+        """Queue the buffered span [start, end) as one finished chunk."""
+        if start >= end and not force:
+            return
+        chunk = self.buffer[start:end]
+        chunk_metadata = {
+            **self.metadata,
+            "chunk_index": self.chunks_created,
+            "char_start": self.buffer_offset + start,
+            "char_end": self.buffer_offset + end,
+            "streamed": True
+        }
+        chunk_id = self.knowledge_base._chunk_id(chunk, self.metadata, self.chunks_created)
+        self.batcher.add([chunk_id], [chunk], [chunk_metadata], [token_ids])
+        self.chunks_created += 1
+
 
 class AgnoRAGKnowledgeBase:
     """Agno-compatible knowledge base with ChromaDB for agentic RAG."""
@@ -19,109 +235,553 @@ class AgnoRAGKnowledgeBase:
         collection_name: str = "documents",
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
+        embedding_batch_size: int = 64,
+        embedding_model: str = "all-MiniLM-L6-v2",
+        embedding_cache_path: Optional[str] = None,
+        embedding_cache_size: int = 200_000,
+        chunking_mode: str = "characters",
+        chunk_token_overlap: int = 32,
+        chunking_workers: int = 0,
+        query_batch_wait_ms: float = 0.0,
+        query_batch_max_size: int = 32,
+        query_cache_size: int = 0,
+        query_cache_ttl: float = 0.0,
+        query_casefold: bool = True,
+        query_collapse_whitespace: bool = True,
+        retrieval_cache_size: int = 0,
+        retrieval_cache_ttl: float = 0.0,
+        vector_backend: str = "chroma",
+        vector_quantization: str = "none",
+        quantization_oversample: int = 8,
+        vector_read_only: bool = False,
+        hnsw_space: str = "cosine",
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 100,
+        hnsw_ef_search: int = 100,
+        hnsw_sync_threshold: int = 1000,
+        hybrid_search: bool = False,
+        bm25_k1: float = 1.2,
+        bm25_b: float = 0.75,
+        rrf_k: int = 60,
+        hybrid_candidates: int = 20,
     ):
-        """Initialize the knowledge base."""
+        """Initialize the knowledge base.
+        
+        With chunking_mode="tokens", chunk_size/chunk_overlap are ignored and
+        chunks are packed up to the embedder's max_seq_length as measured by
+        its own tokenizer, overlapping by chunk_token_overlap tokens.
+        
+        chunking_workers > 0 chunks and tokenizes multi-document batches on
+        that many worker processes (see ParallelChunker).
+        
+        query_batch_wait_ms > 0 embeds concurrent search queries together,
+        waiting up to that long to fill a batch (see QueryEmbeddingBatcher).
+        
+        query_cache_size > 0 keeps that many query embeddings in memory for
+        query_cache_ttl seconds (0 = no expiry), keyed by the normalized query
+        (case folding, whitespace collapsing). The query is embedded as
+        given, so spellings that normalize alike share the first one's vector.
+        
+        retrieval_cache_size > 0 caches that many search() results. Entries
+        are tagged with the collection generation, which every write and
+        clear through this instance bumps. Writes from other processes do
+        not, so there retrieval_cache_ttl bounds how stale a result can be.
+        
+        vector_backend="numpy" stores vectors in a memory-mapped matrix under
+        path and answers searches by exact cosine search (see
+        NumpyVectorStore) instead of through a Chroma HNSW index. With it,
+        vector_quantization="int8" or "binary" scans compact codes and
+        rescores the best n_results * quantization_oversample candidates
+        against the full-precision vectors. vector_read_only=True opens the
+        store as a reader that follows the one process writing to it; writes
+        through this instance then fail.
+        
+        The hnsw_* arguments configure the Chroma HNSW index of a new
+        collection. Space, M and ef_construction are fixed once a collection
+        exists (clear_knowledge_base recreates it with the current values);
+        ef_search and sync_threshold are updated on an existing collection
+        and take effect when its index is next loaded.
+        
+        hybrid_search=True also keeps a BM25 index of the chunk texts under
+        path (see BM25Index), queries it alongside the vector index and
+        merges the two rankings, each hybrid_candidates long, with
+        reciprocal rank fusion (constant rrf_k).
+        """
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError(f"chunk_overlap must be in [0, chunk_size), got {chunk_overlap} with chunk_size {chunk_size}")
+        if chunking_mode not in CHUNKING_MODES:
+            raise ValueError(f"chunking_mode must be one of {CHUNKING_MODES}, got {chunking_mode!r}")
+        if vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"vector_backend must be one of {VECTOR_BACKENDS}, got {vector_backend!r}")
+        if vector_quantization != "none" and vector_backend != "numpy":
+            raise ValueError("vector_quantization requires vector_backend='numpy'")
+        if vector_read_only and vector_backend != "numpy":
+            raise ValueError("vector_read_only requires vector_backend='numpy'")
+        if vector_read_only and hybrid_search:
+            raise ValueError("hybrid_search keeps its BM25 index up to date through writes, so it cannot be combined with vector_read_only")
+        if hnsw_space not in HNSW_SPACES:
+            raise ValueError(f"hnsw_space must be one of {HNSW_SPACES}, got {hnsw_space!r}")
+        
         self.path = path
         self.collection_name = collection_name
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_model = embedding_model
+        self.ingest_timings = IngestTimings()
+        self.chunking_mode = chunking_mode
+        self.chunk_token_overlap = chunk_token_overlap
         
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=path,
-            settings=ChromaSettings(anonymized_telemetry=False)
-        )
+        self.vector_backend = vector_backend
+        self.hnsw_configuration = None
         
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name
-        )
+        if vector_backend == "numpy":
+            # Exact search over a memory-mapped matrix; no Chroma client
+            self.client = None
+            self.collection = NumpyVectorStore(
+                os.path.join(path, f"{collection_name}.numpy"),
+                quantization=vector_quantization,
+                oversample=quantization_oversample,
+                read_only=vector_read_only
+            )
+        else:
+            # Initialize ChromaDB client
+            self.client = chromadb.PersistentClient(
+                path=path,
+                settings=ChromaSettings(anonymized_telemetry=False)
+            )
+            
+            # Get or create collection
+            self.hnsw_configuration = {
+                "space": hnsw_space,
+                "max_neighbors": hnsw_m,
+                "ef_construction": hnsw_ef_construction,
+                "ef_search": hnsw_ef_search,
+                "sync_threshold": hnsw_sync_threshold
+            }
+            self.collection = self.client.get_or_create_collection(
+                name=collection_name,
+                configuration={"hnsw": self.hnsw_configuration}
+            )
+            self._apply_hnsw_configuration()
+        
+        # Scores are derived from distances in the space the index actually uses
+        self.distance_space = self._hnsw_space()
         
         # Initialize embedder
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+        self.embedder = SentenceTransformer(embedding_model)
+        
+        # Token budget per chunk: the model's sequence limit minus [CLS]/[SEP]
+        self.tokenizer = self.embedder.tokenizer
+        self.max_chunk_tokens = self.embedder.max_seq_length - self.tokenizer.num_special_tokens_to_add()
+        self._special_prefix, self._special_suffix = self._special_token_template()
+        if chunking_mode == "tokens" and not 0 <= chunk_token_overlap < self.max_chunk_tokens:
+            raise ValueError(f"chunk_token_overlap must be in [0, {self.max_chunk_tokens}), got {chunk_token_overlap}")
+        
+        self.chunker = Chunker(
+            chunking_mode=chunking_mode,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            tokenizer=self.tokenizer,
+            max_tokens=self.max_chunk_tokens,
+            overlap_tokens=chunk_token_overlap
+        )
+        
+        self.parallel_chunker = ParallelChunker(self.chunker, chunking_workers) if chunking_workers > 0 else None
+        
+        if chunking_mode == "tokens":
+            self._id_prefix = f"{embedding_model}\0tokens\0{self.max_chunk_tokens}\0{chunk_token_overlap}\0"
+        else:
+            self._id_prefix = f"{embedding_model}\0{chunk_size}\0{chunk_overlap}\0"
+        
+        # Persistent embedding cache shared by ingest and search (optional)
+        self.embedding_cache = None
+        if embedding_cache_path:
+            self.embedding_cache = EmbeddingCache(
+                path=embedding_cache_path,
+                model_name=embedding_model,
+                max_entries=embedding_cache_size
+            )
+        
+        # In-memory cache of query embeddings keyed by normalized text (optional)
+        self.query_casefold = query_casefold
+        self.query_collapse_whitespace = query_collapse_whitespace
+        self.query_cache = TTLCache(query_cache_size, query_cache_ttl) if query_cache_size > 0 else None
+        
+        # search() results, valid for one collection generation (optional)
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        self.retrieval_cache = TTLCache(retrieval_cache_size, retrieval_cache_ttl) if retrieval_cache_size > 0 else None
+        
+        # Lexical index queried next to the vector index (optional)
+        self.rrf_k = rrf_k
+        self.hybrid_candidates = hybrid_candidates
+        self.bm25 = None
+        self._lexical_executor = None
+        if hybrid_search:
+            self.bm25 = BM25Index(os.path.join(path, f"{collection_name}.bm25.sqlite3"), k1=bm25_k1, b=bm25_b)
+            self._lexical_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bm25")
+            self._sync_lexical_index()
+        
+        # Concurrent search queries share encode calls (optional)
+        self.query_batcher = None
+        if query_batch_wait_ms > 0:
+            self.query_batcher = QueryEmbeddingBatcher(
+                encode=self._encode,
+                max_batch_size=query_batch_max_size,
+                max_wait_ms=query_batch_wait_ms
+            )
         
         logger.info(f"AgnoRAGKnowledgeBase initialized with collection: {collection_name}")
     
-    def _chunk_text(self, text: str) -> List[str]:
-        """Split text into chunks."""
-        if len(text) <= self.chunk_size:
-            return [text]
+    def _hnsw_space(self) -> str:
+        """Distance space of the collection's index (the numpy backend reports cosine distances)."""
+        if self.client is None:
+            return "cosine"
+        hnsw = (self.collection.configuration or {}).get("hnsw") or {}
+        return hnsw.get("space") or (self.collection.metadata or {}).get("hnsw:space", "l2")
+    
+    def _effective_hnsw_configuration(self) -> Optional[Dict[str, Any]]:
+        """The HNSW settings Chroma actually applied to the collection (None for the numpy backend)."""
+        if self.client is None:
+            return None
+        return (self.collection.configuration or {}).get("hnsw")
+    
+    def _apply_hnsw_configuration(self):
+        """Bring an existing collection's index settings in line with the configured ones.
         
-        chunks = []
-        start = 0
+        Settings Chroma cannot change after creation are only reported.
+        """
+        current = (self.collection.configuration or {}).get("hnsw") or {}
+        fixed = [
+            f"{key}={current[key]} (configured {self.hnsw_configuration[key]})"
+            for key in ("space", "max_neighbors", "ef_construction")
+            if key in current and current[key] != self.hnsw_configuration[key]
+        ]
+        if fixed:
+            logger.warning(
+                f"Collection {self.collection_name} was created with {', '.join(fixed)}; "
+                f"clear the knowledge base to rebuild it with the configured index"
+            )
         
-        while start < len(text):
-            end = start + self.chunk_size
-            chunk = text[start:end]
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                last_period = chunk.rfind('.')
-                last_newline = chunk.rfind('\n')
-                break_point = max(last_period, last_newline)
-                
-                if break_point > self.chunk_size // 2:
-                    chunk = chunk[:break_point + 1]
-                    end = start + break_point + 1
-            
-            chunks.append(chunk.strip())
-            start = end - self.chunk_overlap
-            
-            if start >= len(text):
-                break
+        update = {
+            key: self.hnsw_configuration[key]
+            for key in _MUTABLE_HNSW
+            if key in current and current[key] != self.hnsw_configuration[key]
+        }
+        if update:
+            try:
+                self.collection.modify(configuration={"hnsw": update})
+            except Exception as e:
+                logger.warning(f"Could not update HNSW settings {update} of collection {self.collection_name}: {e}")
+    
+    def _sync_lexical_index(self, page_size: int = 5000):
+        """Rebuild the BM25 index from the collection if they hold different chunk counts.
+        
+        This covers enabling hybrid search on an existing collection and an
+        ingest that was interrupted between the two writes.
+        """
+        count = self.collection.count()
+        if len(self.bm25) == count:
+            return
         
-        return chunks
+        logger.info(f"Rebuilding BM25 index from {count} chunks (it had {len(self.bm25)})")
+        self.bm25.clear()
+        for offset in range(0, count, page_size):
+            page = self.collection.get(limit=page_size, offset=offset, include=["documents"])
+            self.bm25.add(page["ids"], page["documents"])
     
-    def add_text_document(self, content: str, metadata: Optional[Dict[str, Any]] = None) -> List[str]:
-        """Add a text document to the knowledge base."""
-        if metadata is None:
-            metadata = {}
+    def _special_token_template(self) -> Tuple[List[int], List[int]]:
+        """Special token ids the tokenizer puts before and after a single sequence."""
+        with_specials = self.tokenizer("a", add_special_tokens=True)["input_ids"]
+        plain = self.tokenizer("a", add_special_tokens=False)["input_ids"]
+        for i in range(len(with_specials) - len(plain) + 1):
+            if with_specials[i:i + len(plain)] == plain:
+                return with_specials[:i], with_specials[i + len(plain):]
+        return [], []
+    
+    def _chunk_id(self, chunk: str, metadata: Dict[str, Any], index: int) -> str:
+        """Deterministic chunk id.
+        
+        Hashes the chunk text and its index within the document together with
+        the document's metadata (its identity, e.g. filename) and the
+        embedding model and chunking parameters. Re-ingesting the same
+        document with the same metadata maps onto the same ids and is
+        skipped, while identical text in a different document gets its own
+        id and metadata, so metadata filters find it there too (its vector
+        still comes from the embedding cache). A model or chunking change
+        produces new ids.
+        """
+        document_key = json.dumps(metadata, sort_keys=True, default=str)
+        key = f"{self._id_prefix}{document_key}\0{index}\0{chunk}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+    
+    def _existing_ids(self, ids: List[str]) -> Set[str]:
+        """Return which of the given ids are already stored, in one bulk lookup."""
+        if not ids:
+            return set()
+        with self.ingest_timings.measure("lookup"):
+            return set(self.collection.get(ids=ids, include=[])["ids"])
+    
+    def _max_write_batch_size(self) -> int:
+        """Largest number of records ChromaDB accepts in a single add call."""
+        if self.client is None:
+            return self.collection.max_batch_size
+        if hasattr(self.client, "get_max_batch_size"):
+            return self.client.get_max_batch_size()
+        return getattr(self.client, "max_batch_size", 5461)
+    
+    def _encode(self, texts: List[str], token_ids: Optional[List[Optional[List[int]]]] = None) -> np.ndarray:
+        """Embed texts, serving cached vectors and running the model only on misses.
+        
+        When token_ids are given for every miss (token chunking mode), they are
+        fed to the model directly instead of tokenizing the texts again.
+        """
+        if self.embedding_cache is None:
+            cached = [None] * len(texts)
+        else:
+            cached = self.embedding_cache.get_many(texts)
+        
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if token_ids is not None and all(token_ids[i] for i in missing):
+                computed = self._encode_token_ids([token_ids[i] for i in missing])
+            else:
+                computed = self.embedder.encode(
+                    missing_texts,
+                    batch_size=self.embedding_batch_size,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                )
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(missing_texts, computed)
+            for i, vector in zip(missing, computed):
+                cached[i] = vector
+        return np.vstack(cached) if cached else np.zeros((0, 0), dtype=np.float32)
+    
+    def _encode_token_ids(self, token_ids: List[List[int]]) -> np.ndarray:
+        """Embed already-tokenized chunks, batched and sorted by length to limit padding."""
+        order = sorted(range(len(token_ids)), key=lambda i: -len(token_ids[i]))
+        embeddings: List[Optional[np.ndarray]] = [None] * len(token_ids)
+        
+        for start in range(0, len(order), self.embedding_batch_size):
+            batch = order[start:start + self.embedding_batch_size]
+            features = self.tokenizer.pad(
+                {"input_ids": [self._special_prefix + token_ids[i] + self._special_suffix for i in batch]},
+                return_tensors="pt"
+            )
+            features = {key: value.to(self.embedder.device) for key, value in features.items()}
+            with torch.inference_mode():
+                output = self.embedder(features)["sentence_embedding"]
+            for i, vector in zip(batch, output.float().cpu().numpy()):
+                embeddings[i] = vector
+        
+        return np.vstack(embeddings)
+    
+    def normalize_query(self, query: str) -> str:
+        """Query text as used for cache keys (the original text is what gets embedded)."""
+        return normalize_query(query, self.query_casefold, self.query_collapse_whitespace)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embedding of a search query, as search() computes it."""
+        return self._embed_query(query)
+    
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Embed one search query, from the query cache or batched with concurrent queries.
         
+        The query text is embedded as given; only the cache key is
+        normalized, so spellings that normalize alike share the vector of
+        the first one embedded.
+        """
+        key = self.normalize_query(query)
+        if self.query_cache is not None:
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                return cached
+        
+        if self.query_batcher is not None:
+            vector = self.query_batcher.embed(query)
+        else:
+            vector = self._encode([query])[0]
+        
+        if self.query_cache is not None:
+            self.query_cache.put(key, vector)
+        return vector
+    
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed many search queries, encoding all query cache misses in one call (see _embed_query)."""
+        keys = [self.normalize_query(query) for query in queries]
+        vectors: List[Optional[np.ndarray]] = [None] * len(keys)
+        if self.query_cache is not None:
+            vectors = [self.query_cache.get(key) for key in keys]
+        
+        # One original spelling per missing key is embedded
+        missing = {}
+        for query, key, vector in zip(queries, keys, vectors):
+            if vector is None:
+                missing.setdefault(key, query)
+        if missing:
+            computed = dict(zip(missing, self._encode(list(missing.values()))))
+            if self.query_cache is not None:
+                for key, vector in computed.items():
+                    self.query_cache.put(key, vector)
+            vectors = [computed[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    
+    def _embed_chunks(self, chunks: List[str], token_ids: Optional[List[Optional[List[int]]]] = None) -> List[List[float]]:
+        """Embed all chunks in one encode call, batched by embedding_batch_size."""
+        with self.ingest_timings.measure("embedding"):
+            return self._encode(chunks, token_ids).tolist()
+    
+    def _write_chunks(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """Write chunks to ChromaDB in as few add calls as the client allows, then to the BM25 index."""
+        max_batch = self._max_write_batch_size()
         try:
-            # Chunk the document
-            chunks = self._chunk_text(content)
-            chunk_ids = []
-            
-            for i, chunk in enumerate(chunks):
-                chunk_id = str(uuid.uuid4())
-                chunk_metadata = {
+            with self.ingest_timings.measure("writing"):
+                for start in range(0, len(ids), max_batch):
+                    end = start + max_batch
+                    self.collection.add(
+                        embeddings=embeddings[start:end],
+                        documents=documents[start:end],
+                        metadatas=metadatas[start:end],
+                        ids=ids[start:end]
+                    )
+            if self.bm25 is not None:
+                with self.ingest_timings.measure("lexical"):
+                    self.bm25.add(ids, documents)
+        finally:
+            self._bump_generation()
+    
+    def _bump_generation(self):
+        """Mark the collection as changed, invalidating cached search results."""
+        with self._generation_lock:
+            self.generation += 1
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.clear()
+    
+    def _chunk_text(self, text: str) -> List[str]:
+        """Split text into chunks."""
+        return [text[start:end] for start, end, _ in self.chunker.chunk_document(text)]
+    
+    def _prepare_chunks(
+        self,
+        content: str,
+        metadata: Dict[str, Any],
+        spans: Optional[List[Tuple[int, int, Optional[List[int]]]]] = None
+    ) -> Tuple[List[str], List[str], List[Dict[str, Any]], List[Optional[List[int]]]]:
+        """Chunk a document (unless spans are given) and build ids, metadata and token ids for each chunk."""
+        with self.ingest_timings.measure("chunking"):
+            if spans is None:
+                spans = self.chunker.chunk_document(content)
+            chunks = [content[start:end] for start, end, _ in spans]
+            chunk_ids = [self._chunk_id(chunk, metadata, i) for i, chunk in enumerate(chunks)]
+            chunk_metadatas = [
+                {
                     **metadata,
                     "chunk_index": i,
                     "total_chunks": len(chunks),
-                    "original_doc_length": len(content)
+                    "original_doc_length": len(content),
+                    "char_start": start,
+                    "char_end": end
                 }
-                
-                # Generate embedding
-                embedding = self.embedder.encode(chunk).tolist()
-                
-                # Add to ChromaDB
-                self.collection.add(
-                    embeddings=[embedding],
-                    documents=[chunk],
-                    metadatas=[chunk_metadata],
-                    ids=[chunk_id]
-                )
-                
-                chunk_ids.append(chunk_id)
-            
-            logger.info(f"Added document with {len(chunks)} chunks")
+                for i, (start, end, _) in enumerate(spans)
+            ]
+        return chunk_ids, chunks, chunk_metadatas, [token_ids for _, _, token_ids in spans]
+    
+    def _ingest_documents(
+        self,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        progress: Optional[Callable[[str, int], None]] = None
+    ) -> List[List[str]]:
+        """Chunk, embed and write documents, batching chunks across document boundaries.
+        
+        Chunks from all documents are flattened into one pending buffer that is
+        embedded in fixed-size batches and flushed to ChromaDB whenever it reaches
+        the client's max batch size, so many small documents share the same
+        encode and add calls. Returns the chunk ids grouped per source document.
+        
+        Chunk ids are deterministic per document (see _chunk_id); before
+        embedding, each batch is checked against the collection and chunks
+        that are already stored (or repeated within the batch) are skipped, so
+        re-ingesting an unchanged document costs one lookup instead of a
+        forward pass and a write.
+        
+        If given, ``progress`` is called as ``progress(stage, count)`` with stage
+        one of "chunked", "skipped", "embedded" or "written".
+        """
+        batcher = _ChunkBatcher(self, self._max_write_batch_size(), progress)
+        ids_per_document = []
+        
+        if self.parallel_chunker is not None and len(documents) > 1:
+            spans_per_document = self.parallel_chunker.chunk_documents(documents)
+        else:
+            spans_per_document = (None for _ in documents)
+        
+        # Closing the generator frees its shared memory even if a batch write raises
+        with closing(spans_per_document):
+            for content, metadata in zip(documents, metadatas):
+                # Time spent waiting on worker processes counts as chunking
+                with self.ingest_timings.measure("chunking"):
+                    spans = next(spans_per_document)
+                chunk_ids, chunks, chunk_metadatas, token_ids = self._prepare_chunks(content, metadata or {}, spans)
+                ids_per_document.append(chunk_ids)
+                batcher.add(chunk_ids, chunks, chunk_metadatas, token_ids)
+        
+        batcher.flush()
+        
+        return ids_per_document
+    
+    def add_text_document(self, content: str, metadata: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Add a text document to the knowledge base."""
+        try:
+            chunk_ids = self._ingest_documents([content], [metadata or {}])[0]
+            logger.info(f"Added document with {len(chunk_ids)} chunks")
             return chunk_ids
             
         except Exception as e:
             logger.error(f"Failed to add document: {e}")
             raise
     
-    def add_text_documents(self, documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
-        """Add multiple text documents to the knowledge base."""
+    def add_text_documents_grouped(
+        self,
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        progress: Optional[Callable[[str, int], None]] = None
+    ) -> List[List[str]]:
+        """Add multiple text documents and return the chunk ids of each document."""
         if metadatas is None:
             metadatas = [{}] * len(documents)
         
-        all_ids = []
-        for doc, metadata in zip(documents, metadatas):
-            ids = self.add_text_document(doc, metadata)
-            all_ids.extend(ids)
-        
-        return all_ids
+        try:
+            ids_per_document = self._ingest_documents(documents, metadatas, progress)
+            total_chunks = sum(len(ids) for ids in ids_per_document)
+            logger.info(f"Added {len(documents)} documents with {total_chunks} chunks")
+            return ids_per_document
+            
+        except Exception as e:
+            logger.error(f"Failed to add documents: {e}")
+            raise
+    
+    def add_text_documents(self, documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """Add multiple text documents to the knowledge base."""
+        ids_per_document = self.add_text_documents_grouped(documents, metadatas)
+        return [chunk_id for ids in ids_per_document for chunk_id in ids]
+    
+    def open_text_stream(
+        self,
+        metadata: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[str, int], None]] = None
+    ) -> "TextStreamIngest":
+        """Start an incremental ingest of one document that arrives in pieces."""
+        return TextStreamIngest(self, metadata or {}, progress)
     
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the knowledge base."""
@@ -131,48 +791,378 @@ class AgnoRAGKnowledgeBase:
                 "total_documents": count,
                 "collection_name": self.collection_name,
                 "path": self.path,
-                "type": "AgnoRAGKnowledgeBase"
+                "type": "AgnoRAGKnowledgeBase",
+                "vector_backend": self.vector_backend,
+                "vector_store": self.collection.get_stats() if self.client is None else None,
+                "distance_space": self.distance_space,
+                "hnsw": self._effective_hnsw_configuration(),
+                "bm25": self.bm25.get_stats() if self.bm25 is not None else None,
+                "chunking_mode": self.chunking_mode,
+                "ingest_seconds": self.ingest_timings.snapshot(),
+                "embedding_cache": self.embedding_cache.get_stats() if self.embedding_cache else None,
+                "query_batching": self.query_batcher.get_stats() if self.query_batcher else None,
+                "query_embedding_cache": self.query_cache.get_stats() if self.query_cache else None,
+                "retrieval_cache": self.retrieval_cache.get_stats() if self.retrieval_cache else None,
+                "generation": self.generation
             }
         except Exception as e:
             logger.error(f"Failed to get stats: {e}")
             return {"error": str(e)}
     
+    def close(self):
+        """Release worker threads and processes and the embedding cache connection."""
+        if self.query_batcher is not None:
+            self.query_batcher.close()
+        if self.client is None:
+            self.collection.close()
+        if self.bm25 is not None:
+            self._lexical_executor.shutdown()
+            self.bm25.close()
+        if self.parallel_chunker is not None:
+            self.parallel_chunker.shutdown()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+    
     def clear_knowledge_base(self):
         """Clear all documents from the knowledge base."""
         try:
-            self.client.delete_collection(self.collection_name)
-            self.collection = self.client.create_collection(self.collection_name)
+            if self.client is None:
+                self.collection.clear()
+            else:
+                self.client.delete_collection(self.collection_name)
+                self.collection = self.client.create_collection(
+                    self.collection_name,
+                    configuration={"hnsw": self.hnsw_configuration}
+                )
+                self.distance_space = self._hnsw_space()
+            if self.bm25 is not None:
+                self.bm25.clear()
+            self._bump_generation()
             logger.info("Knowledge base cleared successfully")
         except Exception as e:
             logger.error(f"Failed to clear knowledge base: {e}")
             raise
     
-    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Manual search method for fallback scenarios."""
+    def search(
+        self,
+        query: str,
+        limit: int = 5,
+        include: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        ef_search: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Manual search method for fallback scenarios.
+        
+        include projects each result onto a subset of SEARCH_FIELDS; fields
+        left out are not fetched from Chroma at all. Default: all fields.
+        
+        where / where_document are Chroma metadata and document filters
+        (see search_filters), applied inside the index query.
+        
+        ef_search raises the HNSW candidate list size for this query above
+        the collection's configured ef_search (see _candidates).
+        
+        With hybrid search, results are ranked by the reciprocal rank fusion
+        of the vector and BM25 rankings, reported as 'rrf_score'; 'score'
+        stays the cosine similarity (see _fuse).
+        """
         try:
+            include = self._search_fields(include)
+            
+            # Serve repeated searches on an unchanged collection from the cache
+            cache_key = (
+                self.generation, self.normalize_query(query), limit, include,
+                filter_key(where, where_document), self._candidates(limit, ef_search)
+            )
+            if self.retrieval_cache is not None:
+                cached = self.retrieval_cache.get(cache_key)
+                if cached is not None:
+                    return [dict(result) for result in cached]
+            
+            # Query the BM25 index on another thread while the vector index is searched
+            lexical = self._submit_lexical(query, limit, where, where_document)
+            
             # Generate query embedding
-            query_embedding = self.embedder.encode(query).tolist()
+            query_embedding = self._embed_query(query).tolist()
             
             # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=limit
+            results = self._query_index(
+                [query_embedding],
+                self._candidates(limit, ef_search),
+                [self._candidates(limit, None)],
+                where,
+                where_document,
+                include
             )
             
             # Format results
-            formatted_results = []
-            if results['ids'] and len(results['ids'][0]) > 0:
-                for i in range(len(results['ids'][0])):
-                    result = {
-                        'id': results['ids'][0][i],
-                        'content': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
-                        'distance': results['distances'][0][i] if results['distances'] else 0,
-                        'score': 1 - results['distances'][0][i] if results['distances'] else 1.0
-                    }
-                    formatted_results.append(result)
+            formatted_results = self._format_results(results, 0, include)
+            if lexical is not None:
+                formatted_results = self._fuse(formatted_results, lexical, limit, include, query_embedding)
+            else:
+                formatted_results = formatted_results[:limit]
             
+            if self.retrieval_cache is not None:
+                self.retrieval_cache.put(cache_key, [dict(result) for result in formatted_results])
             return formatted_results
         except Exception as e:
             logger.error(f"Failed to search: {e}")
             return []
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        limits: List[int],
+        include: Optional[Sequence[str]] = None,
+        wheres: Optional[List[Optional[Dict[str, Any]]]] = None,
+        where_documents: Optional[List[Optional[Dict[str, Any]]]] = None,
+        ef_searches: Optional[List[Optional[int]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search many queries at once: one embedding call and one multi-vector Chroma query.
+        
+        Each query gets the results search() would return for it; queries
+        already in the retrieval cache are not sent to Chroma. Queries with
+        different filters cannot share a Chroma query, so there is one
+        query per distinct (where, where_document) pair.
+        """
+        try:
+            include = self._search_fields(include)
+            wheres = wheres or [None] * len(queries)
+            where_documents = where_documents or [None] * len(queries)
+            candidates = [self._candidates(limit, ef_search) for limit, ef_search in zip(limits, ef_searches or [None] * len(queries))]
+            filter_keys = [filter_key(where, where_document) for where, where_document in zip(wheres, where_documents)]
+            cache_keys = [
+                (self.generation, self.normalize_query(query), limit, include, key, candidate_count)
+                for query, limit, key, candidate_count in zip(queries, limits, filter_keys, candidates)
+            ]
+            batch_results: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+            if self.retrieval_cache is not None:
+                for i, cache_key in enumerate(cache_keys):
+                    cached = self.retrieval_cache.get(cache_key)
+                    if cached is not None:
+                        batch_results[i] = [dict(result) for result in cached]
+            
+            pending = [i for i, results in enumerate(batch_results) if results is None]
+            if pending:
+                lexical = {i: self._submit_lexical(queries[i], limits[i], wheres[i], where_documents[i]) for i in pending}
+                query_embeddings = dict(zip(pending, self._embed_queries([queries[i] for i in pending]).tolist()))
+                
+                groups: Dict[Optional[str], List[int]] = {}
+                for i in pending:
+                    groups.setdefault(filter_keys[i], []).append(i)
+                
+                for group in groups.values():
+                    # Fetch the most candidates any query in the group needs; results are
+                    # ranked, so each query keeps its own prefix (at least as good as its own ef)
+                    keeps = [self._candidates(limits[i], None) for i in group]
+                    results = self._query_index(
+                        [query_embeddings[i] for i in group],
+                        max(candidates[i] for i in group),
+                        keeps,
+                        wheres[group[0]],
+                        where_documents[group[0]],
+                        include
+                    )
+                    
+                    for row, (i, keep) in enumerate(zip(group, keeps)):
+                        formatted_results = self._format_results(results, row, include)[:keep]
+                        if lexical[i] is not None:
+                            formatted_results = self._fuse(formatted_results, lexical[i], limits[i], include, query_embeddings[i])
+                        else:
+                            formatted_results = formatted_results[:limits[i]]
+                        if self.retrieval_cache is not None:
+                            self.retrieval_cache.put(cache_keys[i], [dict(result) for result in formatted_results])
+                        batch_results[i] = formatted_results
+            
+            return batch_results
+        except Exception as e:
+            logger.error(f"Failed to search batch of {len(queries)} queries: {e}")
+            return [[] for _ in queries]
+    
+    def _candidates(self, limit: int, ef_search: Optional[int]) -> int:
+        """Number of results to request from the index for a search of limit results.
+        
+        hnswlib searches with a candidate list of max(ef_search, n_results),
+        and Chroma only reloads a changed ef_search with the index, so a
+        per-request ef_search is applied by asking for that many results and
+        keeping the best limit (see _query_index). Exact backends ignore it.
+        Hybrid search fuses at least hybrid_candidates vector results.
+        """
+        candidates = limit
+        if ef_search is not None and self.client is not None:
+            candidates = max(candidates, ef_search)
+        if self.bm25 is not None:
+            candidates = max(candidates, self.hybrid_candidates)
+        return candidates
+    
+    def _query_index(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        keeps: List[int],
+        where: Optional[Dict[str, Any]],
+        where_document: Optional[Dict[str, Any]],
+        include: Tuple[str, ...]
+    ) -> Dict[str, Any]:
+        """collection.query results for the included fields, each row cut to its keeps entry.
+        
+        When n_results is only raised for a per-request ef_search, the index
+        is asked for ids and distances alone, and the documents and
+        metadatas of the rows kept are then read with one collection.get,
+        so the extra candidates are never loaded or deserialized.
+        """
+        fields = self._chroma_include(include)
+        stored = [field for field in fields if field != "distances"]
+        if n_results <= max(keeps) or not stored:
+            results = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where or None,
+                where_document=where_document or None,
+                include=fields
+            )
+            results['ids'] = [row[:keep] for row, keep in zip(results['ids'], keeps)]
+            if results.get('distances'):
+                results['distances'] = [row[:keep] for row, keep in zip(results['distances'], keeps)]
+            return results
+        
+        ranked = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where or None,
+            where_document=where_document or None,
+            include=[field for field in fields if field == "distances"]
+        )
+        ids = [row[:keep] for row, keep in zip(ranked['ids'], keeps)]
+        records = self.collection.get(ids=list({chunk_id for row in ids for chunk_id in row}), include=stored)
+        position = {chunk_id: i for i, chunk_id in enumerate(records['ids'])}
+        return {
+            'ids': ids,
+            'distances': [row[:keep] for row, keep in zip(ranked['distances'], keeps)] if ranked.get('distances') else None,
+            'documents': [[records['documents'][position[chunk_id]] for chunk_id in row] for row in ids] if "documents" in stored else None,
+            'metadatas': [[records['metadatas'][position[chunk_id]] for chunk_id in row] for row in ids] if "metadatas" in stored else None
+        }
+    
+    def _submit_lexical(
+        self,
+        query: str,
+        limit: int,
+        where: Optional[Dict[str, Any]],
+        where_document: Optional[Dict[str, Any]]
+    ) -> Optional[Future]:
+        """Start a BM25 search for query on the lexical pool, or None without hybrid search."""
+        if self.bm25 is None:
+            return None
+        return self._lexical_executor.submit(self._lexical_search, query, max(limit, self.hybrid_candidates), where, where_document)
+    
+    def _lexical_search(
+        self,
+        query: str,
+        count: int,
+        where: Optional[Dict[str, Any]],
+        where_document: Optional[Dict[str, Any]]
+    ) -> List[str]:
+        """Ids of the best count chunks for query by BM25, restricted to the filters."""
+        if not where and not where_document:
+            return [chunk_id for chunk_id, _ in self.bm25.search(query, count)]
+        
+        # The BM25 index holds no metadata: over-fetch, then keep the hits the collection says pass
+        hits = [chunk_id for chunk_id, _ in self.bm25.search(query, 4 * count)]
+        if not hits:
+            return []
+        allowed = set(self.collection.get(ids=hits, where=where or None, where_document=where_document or None, include=[])["ids"])
+        return [chunk_id for chunk_id in hits if chunk_id in allowed][:count]
+    
+    def _fuse(
+        self,
+        vector_results: List[Dict[str, Any]],
+        lexical: Future,
+        limit: int,
+        include: Tuple[str, ...],
+        query_embedding: Sequence[float]
+    ) -> List[Dict[str, Any]]:
+        """Top-limit results by reciprocal rank fusion of the vector results and the BM25 ranking.
+        
+        Each ranking contributes 1 / (rrf_k + rank) per chunk, reported as
+        'rrf_score'. 'score' stays the cosine similarity to the query:
+        chunks found only by BM25 are fetched from the collection for the
+        included fields, and their similarity is computed from the stored
+        embedding (they have no distance). If the BM25 search failed, the
+        vector results are returned unchanged.
+        """
+        try:
+            lexical_ids = lexical.result()
+        except Exception as e:
+            logger.error(f"BM25 search failed, using vector results only: {e}")
+            return vector_results[:limit]
+        
+        fused: Dict[str, float] = {}
+        for ranking in ([result['id'] for result in vector_results], lexical_ids):
+            for rank, chunk_id in enumerate(ranking, start=1):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1 / (self.rrf_k + rank)
+        top = sorted(fused, key=fused.get, reverse=True)[:limit]
+        
+        by_id = {result['id']: result for result in vector_results}
+        missing = [chunk_id for chunk_id in top if chunk_id not in by_id]
+        fields = [field for field in self._chroma_include(include) if field != "distances"]
+        if "scores" in include:
+            fields.append("embeddings")
+        if missing:
+            records = self.collection.get(ids=missing, include=fields)
+            if "scores" in include:
+                query = np.asarray(query_embedding, dtype=np.float32)
+                embeddings = np.asarray(records['embeddings'], dtype=np.float32).reshape(len(records['ids']), -1)
+                norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query)
+                similarities = embeddings @ query / np.where(norms == 0, 1, norms)
+            for i, chunk_id in enumerate(records['ids']):
+                result = {'id': chunk_id}
+                if "content" in include:
+                    result['content'] = records['documents'][i]
+                if "metadata" in include:
+                    result['metadata'] = records['metadatas'][i] or {}
+                if "scores" in include:
+                    result['score'] = float(similarities[i])
+                by_id[chunk_id] = result
+        
+        fused_results = []
+        for chunk_id in top:
+            result = by_id.get(chunk_id)
+            if result is None:
+                continue
+            if "scores" in include:
+                result['rrf_score'] = fused[chunk_id]
+            fused_results.append(result)
+        return fused_results
+    
+    @staticmethod
+    def _search_fields(include: Optional[Sequence[str]]) -> Tuple[str, ...]:
+        """Validated, canonically ordered search fields (all of them by default)."""
+        if include is None:
+            return SEARCH_FIELDS
+        unknown = set(include) - set(SEARCH_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown search fields {sorted(unknown)}; expected a subset of {SEARCH_FIELDS}")
+        return tuple(field for field in SEARCH_FIELDS if field in include)
+    
+    @staticmethod
+    def _chroma_include(fields: Tuple[str, ...]) -> List[str]:
+        """Chroma include list for the requested search fields (ids are always returned)."""
+        return [_CHROMA_INCLUDE[field] for field in fields if field in _CHROMA_INCLUDE]
+    
+    def _format_results(self, results: Dict[str, Any], row: int, include: Tuple[str, ...] = SEARCH_FIELDS) -> List[Dict[str, Any]]:
+        """Result dicts for one query row of a collection.query response, with only the included fields."""
+        score = SCORE_FROM_DISTANCE[self.distance_space]
+        formatted_results = []
+        if results['ids'] and len(results['ids'][row]) > 0:
+            for i in range(len(results['ids'][row])):
+                result = {'id': results['ids'][row][i]}
+                if "content" in include:
+                    result['content'] = results['documents'][row][i]
+                if "metadata" in include:
+                    result['metadata'] = results['metadatas'][row][i] if results['metadatas'] else {}
+                if "scores" in include:
+                    result['distance'] = results['distances'][row][i] if results['distances'] else 0
+                    result['score'] = score(results['distances'][row][i]) if results['distances'] else 1.0
+                formatted_results.append(result)
+        return formatted_results
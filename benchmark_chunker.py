@@ -0,0 +1,84 @@
+"""Micro-benchmark of the offset-based chunker against the previous slicing chunker."""
+
+import argparse
+import logging
+import random
+import sys
+import time
+
+from chunking import chunk_spans
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def legacy_chunk_text(text: str, chunk_size: int, chunk_overlap: int):
+    """Previous chunker: slices, two rfinds and strip() per window."""
+    if len(text) <= chunk_size:
+        return [text]
+    
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end]
+        if end < len(text):
+            break_point = max(chunk.rfind('.'), chunk.rfind('\n'))
+            if break_point > chunk_size // 2:
+                chunk = chunk[:break_point + 1]
+                end = start + break_point + 1
+        chunks.append(chunk.strip())
+        start = end - chunk_overlap
+        if start >= len(text):
+            break
+    return chunks
+
+
+def make_text(num_chars: int, sentence_prob: float, seed: int = 0) -> str:
+    """Synthetic text with a period after roughly sentence_prob of the words."""
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < num_chars:
+        word = f"w{rng.randint(0, 9999)}" + ("." if rng.random() < sentence_prob else "")
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def best_of(func, repeats: int) -> float:
+    """Best wall time of func over repeats runs."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mb", type=float, default=8.0, help="Input size in megabytes")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    
+    num_chars = int(args.mb * 1024 * 1024)
+    for name, sentence_prob in [("prose", 0.08), ("no_boundaries", 0.0)]:
+        text = make_text(num_chars, sentence_prob)
+        legacy = best_of(lambda: legacy_chunk_text(text, args.chunk_size, args.chunk_overlap), args.repeats)
+        spans = best_of(lambda: chunk_spans(text, args.chunk_size, args.chunk_overlap), args.repeats)
+        chunks = best_of(
+            lambda: [text[s:e] for s, e in chunk_spans(text, args.chunk_size, args.chunk_overlap)],
+            args.repeats
+        )
+        logger.info(
+            f"{name:>14}: legacy {legacy * 1000:.1f} ms, spans {spans * 1000:.1f} ms, "
+            f"spans+copy {chunks * 1000:.1f} ms ({num_chars / spans / 1e6:.0f} M chars/s)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
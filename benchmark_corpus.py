@@ -0,0 +1,76 @@
+"""Synthetic corpora and scratch directories shared by the benchmark scripts."""
+
+import math
+import os
+import random
+import shutil
+from contextlib import contextmanager
+from typing import Iterator, List
+
+WORDS = (
+    "retrieval augmented generation vector embedding chunk index query document "
+    "knowledge agent model latency throughput batch context answer error code "
+    "service request response cache token sentence boundary overlap shard"
+).split()
+
+
+def document_lengths(num_docs: int, distribution: str, mean_chars: int, seed: int) -> List[int]:
+    """Draw document lengths (in characters) from the requested distribution."""
+    rng = random.Random(seed)
+    if distribution == "fixed":
+        return [mean_chars] * num_docs
+    if distribution == "uniform":
+        return [rng.randint(1, 2 * mean_chars) for _ in range(num_docs)]
+    if distribution == "lognormal":
+        # Heavy-tailed: many short documents and a few very long ones
+        sigma = 1.0
+        mu = math.log(mean_chars) - sigma ** 2 / 2
+        return [max(1, int(rng.lognormvariate(mu, sigma))) for _ in range(num_docs)]
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+
+def make_corpus(num_docs: int, distribution: str, mean_chars: int, seed: int = 0) -> List[str]:
+    """Synthetic prose documents with sentence and paragraph breaks."""
+    rng = random.Random(seed + 1)
+    documents = []
+    for length in document_lengths(num_docs, distribution, mean_chars, seed):
+        parts = []
+        size = 0
+        while size < length:
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize()
+            sentence += ".\n\n" if rng.random() < 0.1 else ". "
+            parts.append(sentence)
+            size += len(sentence)
+        documents.append("".join(parts)[:length])
+    return documents
+
+
+def make_document(num_chars: int, seed: int = 0) -> str:
+    """One synthetic document of num_chars characters."""
+    return make_corpus(1, "fixed", num_chars, seed)[0]
+
+
+@contextmanager
+def scratch_directory(path: str) -> Iterator[str]:
+    """A directory at path for benchmark data, cleaned up afterwards.
+    
+    Raises FileExistsError if path exists and is not an empty directory,
+    so a mistyped --path never deletes unrelated data. A directory created
+    here is removed; an existing empty one is emptied again and kept.
+    """
+    existed = os.path.exists(path)
+    if existed and (not os.path.isdir(path) or os.listdir(path)):
+        raise FileExistsError(f"{path} already exists and is not an empty directory; choose another --path")
+    os.makedirs(path, exist_ok=True)
+    try:
+        yield path
+    finally:
+        if not existed:
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            for entry in os.listdir(path):
+                entry_path = os.path.join(path, entry)
+                if os.path.isdir(entry_path) and not os.path.islink(entry_path):
+                    shutil.rmtree(entry_path, ignore_errors=True)
+                else:
+                    os.remove(entry_path)
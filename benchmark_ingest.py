@@ -0,0 +1,79 @@
+"""Ingest benchmark comparing per-chunk and batched embedding paths."""
+
+import argparse
+import logging
+import sys
+import time
+import uuid
+
+from benchmark_corpus import make_document, scratch_directory
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def ingest_per_chunk(kb, content: str):
+    """Baseline: one encode and one Chroma write per chunk."""
+    for i, chunk in enumerate(kb._chunk_text(content)):
+        kb.collection.add(
+            embeddings=[kb.embedder.encode(chunk).tolist()],
+            documents=[chunk],
+            metadatas=[{"chunk_index": i}],
+            ids=[str(uuid.uuid4())]
+        )
+
+
+def ingest_batched(kb, content: str):
+    """Batched path: one encode call and bulk writes."""
+    kb.add_text_document(content)
+
+
+def run(path: str, num_chars: int, batch_size: int) -> int:
+    """Run both ingest paths against a fresh local collection and report timings."""
+    with scratch_directory(path):
+        return _run(path, num_chars, batch_size)
+
+
+def _run(path: str, num_chars: int, batch_size: int) -> int:
+    """run() inside its scratch directory."""
+    from agno_knowledge import AgnoRAGKnowledgeBase
+    
+    kb = AgnoRAGKnowledgeBase(
+        path=path,
+        collection_name="benchmark",
+        embedding_batch_size=batch_size
+    )
+    content = make_document(num_chars)
+    num_chunks = len(kb._chunk_text(content))
+    logger.info(f"Document: {len(content)} chars, {num_chunks} chunks")
+    
+    # Warm up the model so neither path pays the first-call cost
+    kb.embedder.encode(["warm up"])
+    
+    timings = {}
+    for name, ingest in [("per_chunk", ingest_per_chunk), ("batched", ingest_batched)]:
+        kb.clear_knowledge_base()
+        start = time.perf_counter()
+        ingest(kb, content)
+        timings[name] = time.perf_counter() - start
+        logger.info(f"{name:>10}: {timings[name]:.2f}s ({num_chunks / timings[name]:.1f} chunks/s)")
+    
+    logger.info(f"Speedup: {timings['per_chunk'] / timings['batched']:.1f}x")
+    kb.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--path", default="./benchmark_chroma_db", help="Scratch directory; must not exist or be empty (removed afterwards)")
+    parser.add_argument("--chars", type=int, default=160_000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    try:
+        return run(args.path, args.chars, args.batch_size)
+    except FileExistsError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
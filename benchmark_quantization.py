@@ -0,0 +1,135 @@
+"""Recall/latency/memory benchmark of quantized NumpyVectorStore search.
+
+Fills an exact (float32) store and int8 / binary stores with the same
+vectors, then reports, per quantization mode and oversample factor, the
+recall@k against exact search, the per-query latency and the bytes each
+query scans. Vectors are synthetic clustered embeddings by default, or
+real all-MiniLM-L6-v2 embeddings of a synthetic corpus with --source model
+(the model must be cached locally).
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from benchmark_corpus import scratch_directory
+from numpy_store import NumpyVectorStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Gaussian clusters, so neighbours are meaningful as in real embedding spaces."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    return centers[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+
+
+def model_vectors(count: int, seed: int, model_name: str) -> np.ndarray:
+    """Embeddings of synthetic sentences from the real model."""
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    from sentence_transformers import SentenceTransformer
+    from benchmark_corpus import make_corpus
+    
+    texts = make_corpus(count, "lognormal", 300, seed)
+    return SentenceTransformer(model_name).encode(texts, batch_size=64, convert_to_numpy=True, show_progress_bar=False)
+
+
+def fill_store(path: str, vectors: np.ndarray, quantization: str, oversample: int) -> NumpyVectorStore:
+    """A fresh store at path holding vectors under ids "0".."n-1"."""
+    shutil.rmtree(path, ignore_errors=True)
+    store = NumpyVectorStore(path, quantization=quantization, oversample=oversample)
+    for start in range(0, len(vectors), store.max_batch_size):
+        end = min(start + store.max_batch_size, len(vectors))
+        store.add([str(i) for i in range(start, end)], vectors[start:end])
+    return store
+
+
+def timed_query(store: NumpyVectorStore, queries: np.ndarray, k: int) -> Tuple[List[List[str]], float]:
+    """Run queries one at a time; return their ids and mean milliseconds per query."""
+    store.query(queries[:1], k, include=[])
+    ids = []
+    start = time.perf_counter()
+    for query in queries:
+        ids.append(store.query(query[None, :], k, include=[])["ids"][0])
+    return ids, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def run(args) -> Dict[str, Any]:
+    """Measure every quantization mode and oversample factor against exact search."""
+    if args.source == "model":
+        vectors = model_vectors(args.vectors + args.queries, args.seed, args.model)
+    else:
+        vectors = synthetic_vectors(args.vectors + args.queries, args.dim, args.clusters, args.seed)
+    corpus, queries = vectors[:args.vectors], vectors[args.vectors:]
+    logger.info(f"{len(corpus)} vectors of dimension {corpus.shape[1]}, {len(queries)} queries, k={args.k}")
+    
+    exact_store = fill_store(os.path.join(args.path, "none"), corpus, "none", 1)
+    exact_ids, exact_ms = timed_query(exact_store, queries, args.k)
+    exact_bytes = exact_store.get_stats()["scan_bytes"]
+    exact_store.close()
+    
+    runs = [{"quantization": "none", "oversample": None, "recall": 1.0, "ms_per_query": exact_ms, "scan_bytes": exact_bytes}]
+    for quantization in ("int8", "binary"):
+        store = fill_store(os.path.join(args.path, quantization), corpus, quantization, 1)
+        scan_bytes = store.get_stats()["scan_bytes"]
+        for oversample in args.oversample:
+            store.oversample = oversample
+            ids, ms = timed_query(store, queries, args.k)
+            recall = float(np.mean([len(set(found) & set(truth)) / len(truth) for found, truth in zip(ids, exact_ids)]))
+            runs.append({
+                "quantization": quantization,
+                "oversample": oversample,
+                "recall": recall,
+                "ms_per_query": ms,
+                "scan_bytes": scan_bytes
+            })
+        store.close()
+    
+    for result in runs:
+        oversample = "-" if result["oversample"] is None else result["oversample"]
+        logger.info(
+            f"{result['quantization']:>7} x{oversample:<3} recall@{args.k} {result['recall']:.3f}  "
+            f"{result['ms_per_query']:7.2f} ms/query  scan {result['scan_bytes'] / 1e6:8.1f} MB "
+            f"({exact_bytes / result['scan_bytes']:.0f}x smaller)"
+        )
+    return {"config": {key: value for key, value in vars(args).items() if key != "output"}, "runs": runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="./benchmark_quantization_db", help="Scratch directory; must not exist or be empty (removed afterwards)")
+    parser.add_argument("--source", choices=["synthetic", "model"], default="synthetic")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic vector dimension")
+    parser.add_argument("--clusters", type=int, default=200, help="Synthetic cluster count")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversample", type=lambda value: [int(x) for x in value.split(",")], default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+    
+    try:
+        with scratch_directory(args.path):
+            result = run(args)
+    except FileExistsError as e:
+        parser.error(str(e))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Ingest throughput benchmark suite with a per-stage time breakdown.
+
+Builds a synthetic corpus, ingests it through AgnoRAGKnowledgeBase into a
+local persist directory, and reports docs/s, chunks/s and the time spent in
+chunking, existing-id lookups, embedding and Chroma writes. Results are
+written as JSON so runs from different commits can be compared with
+--compare.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, Any
+
+from benchmark_corpus import make_corpus, scratch_directory
+
+# Never reach out to the Hugging Face Hub; the embedding model must be cached locally
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def git_revision() -> str:
+    """Current commit, so results can be matched to the code that produced them."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def run(args) -> Dict[str, Any]:
+    """Ingest the corpus in batches and collect throughput and stage timings."""
+    with scratch_directory(args.path):
+        return _run(args)
+
+
+def _run(args) -> Dict[str, Any]:
+    """run() inside its scratch directory."""
+    from agno_knowledge import AgnoRAGKnowledgeBase
+    
+    kb = AgnoRAGKnowledgeBase(
+        path=args.path,
+        collection_name="benchmark",
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        embedding_batch_size=args.embedding_batch_size,
+        chunking_mode=args.chunking_mode,
+        chunking_workers=args.chunking_workers
+    )
+    
+    corpus = make_corpus(args.docs, args.distribution, args.mean_chars, args.seed)
+    total_chars = sum(len(document) for document in corpus)
+    logger.info(f"Corpus: {len(corpus)} documents, {total_chars} characters ({args.distribution})")
+    
+    # Warm up the model so the first batch does not pay the load cost
+    kb._embed_chunks(["warm up"])
+    kb.ingest_timings.reset()
+    
+    total_chunks = 0
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), args.request_size):
+        batch = corpus[offset:offset + args.request_size]
+        total_chunks += sum(len(ids) for ids in kb.add_text_documents_grouped(batch))
+    elapsed = time.perf_counter() - start
+    
+    stages = kb.ingest_timings.snapshot()
+    kb.close()
+    
+    return {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "documents": len(corpus),
+        "characters": total_chars,
+        "chunks": total_chunks,
+        "seconds": elapsed,
+        "docs_per_second": len(corpus) / elapsed,
+        "chunks_per_second": total_chunks / elapsed,
+        "stage_seconds": stages,
+        "other_seconds": max(0.0, elapsed - sum(stages.values()))
+    }
+
+
+def report(result: Dict[str, Any], baseline: Dict[str, Any] = None):
+    """Log a run, with relative change against a baseline run if given."""
+    def delta(current: float, previous: float) -> str:
+        return f" ({(current - previous) / previous * 100:+.1f}%)" if previous else ""
+    
+    base = baseline or {}
+    logger.info(f"Revision {result['revision']}" + (f" vs {base.get('revision')}" if baseline else ""))
+    logger.info(f"  docs/s:   {result['docs_per_second']:.1f}" + delta(result['docs_per_second'], base.get('docs_per_second', 0)))
+    logger.info(f"  chunks/s: {result['chunks_per_second']:.1f}" + delta(result['chunks_per_second'], base.get('chunks_per_second', 0)))
+    previous_stages = {**base.get("stage_seconds", {}), "other": base.get("other_seconds", 0)}
+    for stage, seconds in {**result["stage_seconds"], "other": result["other_seconds"]}.items():
+        previous = previous_stages.get(stage, 0)
+        share = seconds / result["seconds"] * 100 if result["seconds"] else 0
+        logger.info(f"  {stage:<10} {seconds:8.2f}s {share:5.1f}%" + delta(seconds, previous))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="./benchmark_chroma_db", help="Local persist directory; must not exist or be empty (removed afterwards)")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--mean-chars", type=int, default=3000)
+    parser.add_argument("--request-size", type=int, default=100, help="Documents per add_text_documents call")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--chunking-mode", choices=["characters", "tokens"], default="characters")
+    parser.add_argument("--chunking-workers", type=int, default=0)
+    parser.add_argument("--embedding-batch-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file to write (default: bench_results/<revision>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier JSON result to compare against")
+    args = parser.parse_args()
+    
+    try:
+        result = run(args)
+    except FileExistsError as e:
+        parser.error(str(e))
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(result, baseline)
+    
+    output = args.output or os.path.join("bench_results", f"{result['revision']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    logger.info(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""Persistent BM25 inverted index for lexical retrieval alongside the vector store."""
+
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Words, plus identifiers joined by - . / : (ERR-4012, v1.2.3, SKU/88-B) kept whole
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Case-folded terms of text; a compound identifier yields itself and its parts."""
+    tokens = []
+    for token in _TOKEN.findall(text.casefold()):
+        tokens.append(token)
+        parts = _WORD.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over chunk texts, persisted in SQLite and held in memory as numpy postings.
+    
+    Chunks get dense row numbers in insertion order. Each add() stores one
+    posting segment per term: the rows (relative to the segment's first
+    row, as uint16 when the batch spans fewer than 65536 rows, else uint32)
+    and the term frequencies (uint16), so postings take 4-6 bytes on disk.
+    In memory a term's segments are concatenated into one uint32 row array
+    and one uint16 frequency array the first time a query needs them.
+    Chunks are only ever added or cleared all at once, matching the
+    collection they index.
+    """
+    
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        """Open (or create) the index database and load it into memory."""
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS docs (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                length INTEGER NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                segment INTEGER NOT NULL,
+                rows BLOB NOT NULL,
+                tfs BLOB NOT NULL,
+                PRIMARY KEY (term, segment)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.commit()
+        self._load()
+        
+        logger.info(f"BM25Index opened at {path} with {self._count} chunks and {len(self._postings)} terms")
+    
+    def _reset(self):
+        """Empty in-memory state."""
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lengths = np.zeros(1024, dtype=np.float32)
+        self._count = 0
+        self._total_length = 0
+        self._postings: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+    
+    def _load(self):
+        """Read documents and posting segments from disk."""
+        self._reset()
+        docs = self._conn.execute("SELECT row, id, length FROM docs ORDER BY row").fetchall()
+        self._ids = [chunk_id for _, chunk_id, _ in docs]
+        self._rows = {chunk_id: row for row, chunk_id, _ in docs}
+        self._count = len(docs)
+        self._lengths = np.zeros(max(1024, self._count), dtype=np.float32)
+        self._lengths[:self._count] = [length for _, _, length in docs]
+        self._total_length = int(self._lengths[:self._count].sum())
+        
+        for term, segment, rows, tfs in self._conn.execute("SELECT term, segment, rows, tfs FROM postings ORDER BY term, segment"):
+            # Frequencies are uint16, so equal byte lengths mean uint16 rows
+            dtype = np.uint16 if len(rows) == len(tfs) else np.uint32
+            self._postings.setdefault(term, []).append((
+                np.frombuffer(rows, dtype=dtype).astype(np.uint32) + segment,
+                np.frombuffer(tfs, dtype=np.uint16)
+            ))
+    
+    def __len__(self) -> int:
+        """Number of indexed chunks."""
+        return self._count
+    
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        """Index chunks; ids that are already indexed are skipped."""
+        with self._lock:
+            fresh = {}
+            for chunk_id, text in zip(ids, texts):
+                if chunk_id not in self._rows and chunk_id not in fresh:
+                    fresh[chunk_id] = Counter(tokenize(text))
+            if not fresh:
+                return
+            
+            start = self._count
+            by_term: Dict[str, Tuple[List[int], List[int]]] = {}
+            lengths = []
+            for offset, counts in enumerate(fresh.values()):
+                lengths.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    rows, tfs = by_term.setdefault(term, ([], []))
+                    rows.append(offset)
+                    tfs.append(min(tf, 65535))
+            
+            row_dtype = np.uint16 if len(fresh) <= 65536 else np.uint32
+            segments = {
+                term: (np.array(rows, dtype=row_dtype), np.array(tfs, dtype=np.uint16))
+                for term, (rows, tfs) in by_term.items()
+            }
+            self._conn.executemany(
+                "INSERT INTO docs (row, id, length) VALUES (?, ?, ?)",
+                [(start + offset, chunk_id, length) for offset, (chunk_id, length) in enumerate(zip(fresh, lengths))]
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, segment, rows, tfs) VALUES (?, ?, ?, ?)",
+                [(term, start, rows.tobytes(), tfs.tobytes()) for term, (rows, tfs) in segments.items()]
+            )
+            self._conn.commit()
+            
+            end = start + len(fresh)
+            if end > len(self._lengths):
+                grown = np.zeros(max(end, 2 * len(self._lengths)), dtype=np.float32)
+                grown[:start] = self._lengths[:start]
+                self._lengths = grown
+            self._lengths[start:end] = lengths
+            for offset, chunk_id in enumerate(fresh):
+                self._rows[chunk_id] = start + offset
+            self._ids.extend(fresh)
+            self._total_length += sum(lengths)
+            for term, (rows, tfs) in segments.items():
+                self._postings.setdefault(term, []).append((rows.astype(np.uint32) + start, tfs))
+            self._count = end
+    
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """A term's rows and frequencies as single arrays (merging its segments once)."""
+        segments = self._postings.get(term)
+        if not segments:
+            return None
+        if len(segments) > 1:
+            merged = (np.concatenate([rows for rows, _ in segments]), np.concatenate([tfs for _, tfs in segments]))
+            self._postings[term] = [merged]
+        return self._postings[term][0]
+    
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """Top-limit (chunk id, BM25 score) pairs for query, best first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            count = self._count
+            if not count or not terms or limit <= 0:
+                return []
+            postings = [(term_postings, len(term_postings[0])) for term_postings in map(self._term_postings, terms) if term_postings]
+            lengths = self._lengths[:count]
+            average_length = self._total_length / count or 1.0
+            ids = self._ids
+        
+        scores = np.zeros(count, dtype=np.float32)
+        norms = self.k1 * (1 - self.b + self.b * lengths / average_length)
+        for (rows, tfs), df in postings:
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            tf = tfs.astype(np.float32)
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norms[rows])
+        
+        hits = np.flatnonzero(scores)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(ids[row], float(scores[row])) for row in hits]
+    
+    def clear(self):
+        """Remove every indexed chunk."""
+        with self._lock:
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.commit()
+            self._reset()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Chunk, term and posting counts and the in-memory posting size."""
+        with self._lock:
+            postings = sum(len(rows) for segments in self._postings.values() for rows, _ in segments)
+            return {
+                "chunks": self._count,
+                "terms": len(self._postings),
+                "postings": postings,
+                "posting_bytes": postings * 6,
+                "average_length": self._total_length / self._count if self._count else 0.0,
+                "k1": self.k1,
+                "b": self.b
+            }
+    
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,181 @@
+"""Offset-based text chunking shared by batch and streaming ingest."""
+
+from typing import Iterator, List, Optional, Tuple
+
+CHUNKING_MODES = ("characters", "tokens")
+
+
+def next_window_start(start: int, end: int, chunk_overlap: int) -> int:
+    """Start of the window after (start, end).
+    
+    Steps back by chunk_overlap but always advances by at least half of the
+    window, so a large overlap combined with an early sentence break cannot
+    stall (or reverse) the chunker.
+    """
+    return max(end - chunk_overlap, start + (end - start + 1) // 2)
+
+
+def iter_windows(text: str, chunk_size: int, chunk_overlap: int, final: bool = True) -> Iterator[Tuple[int, int]]:
+    """Yield raw (start, end) chunk windows over text, always moving forward.
+    
+    Each window is at most chunk_size characters and is cut after the last
+    period or newline in it when that boundary lies past the middle of the
+    window. Only that back half is searched, with str.rfind bounded by
+    offsets, so no substring is copied and every character is examined a
+    bounded number of times: the total work is linear in len(text).
+    
+    With final=False the window that would reach the end of text is not
+    yielded, because more text may still arrive; the caller resumes from
+    next_window_start() of the last window it received.
+    """
+    length = len(text)
+    start = 0
+    
+    while start < length:
+        limit = start + chunk_size
+        if limit >= length:
+            if final:
+                yield start, length
+            return
+        
+        # Try to break at sentence boundary in the back half of the window
+        floor = start + chunk_size // 2 + 1
+        break_point = max(text.rfind('.', floor, limit), text.rfind('\n', floor, limit))
+        end = break_point + 1 if break_point != -1 else limit
+        yield start, end
+        start = next_window_start(start, end, chunk_overlap)
+
+
+def strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Narrow (start, end) to exclude leading and trailing whitespace."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def chunk_spans(text: str, chunk_size: int, chunk_overlap: int) -> List[Tuple[int, int]]:
+    """Character spans of the chunks of text, whitespace-stripped and non-empty."""
+    if len(text) <= chunk_size:
+        return [(0, len(text))]
+    
+    spans = []
+    for start, end in iter_windows(text, chunk_size, chunk_overlap):
+        start, end = strip_span(text, start, end)
+        if start < end:
+            spans.append((start, end))
+    return spans
+
+
+def _ends_sentence(text: str, offsets: List[Tuple[int, int]], index: int) -> bool:
+    """Whether token index ends with a period or is followed by a newline."""
+    token_end = offsets[index][1]
+    if token_end and text[token_end - 1] == '.':
+        return True
+    next_start = offsets[index + 1][0] if index + 1 < len(offsets) else len(text)
+    return text.find('\n', token_end, next_start) != -1
+
+
+def iter_token_windows(
+    text: str,
+    offsets: List[Tuple[int, int]],
+    max_tokens: int,
+    overlap_tokens: int,
+    final: bool = True
+) -> Iterator[Tuple[int, int]]:
+    """Yield (first, last) token index windows of at most max_tokens tokens.
+    
+    offsets are the tokenizer's character offsets for text. Windows follow the
+    same rules as iter_windows, measured in tokens instead of characters: a
+    window is cut after the last sentence-ending token in its back half, the
+    next one starts overlap_tokens earlier, and progress is always at least
+    half a window.
+    
+    With final=False, tokens after the last whitespace in text are held back
+    (they may be the start of a word that continues in the next block) and
+    the window reaching the end is not yielded.
+    """
+    available = len(offsets)
+    if not final:
+        last_space = max(text.rfind(' '), text.rfind('\n'), text.rfind('\t'))
+        while available and offsets[available - 1][1] > last_space:
+            available -= 1
+    
+    start = 0
+    while start < available:
+        limit = start + max_tokens
+        if limit >= available:
+            if final:
+                yield start, available
+            return
+        
+        # Try to break at sentence boundary in the back half of the window
+        end = limit
+        for index in range(limit - 1, start + max_tokens // 2, -1):
+            if _ends_sentence(text, offsets, index):
+                end = index + 1
+                break
+        yield start, end
+        start = next_window_start(start, end, overlap_tokens)
+
+
+class Chunker:
+    """Chunking configuration plus the tokenizer for token mode.
+    
+    Holds no other state, so it can be pickled once into worker processes
+    (see parallel_chunking) and produce exactly the chunks the knowledge
+    base would produce in-process.
+    """
+    
+    def __init__(
+        self,
+        chunking_mode: str = "characters",
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        tokenizer=None,
+        max_tokens: int = 0,
+        overlap_tokens: int = 0
+    ):
+        """Initialize the chunker."""
+        self.chunking_mode = chunking_mode
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+    
+    def iter_chunks(self, text: str, final: bool = True) -> Iterator[Tuple[int, int, Optional[List[int]], int]]:
+        """Yield (char_start, char_end, token_ids, resume) for each chunk window of text.
+        
+        token_ids is only set in token mode; resume is the character offset
+        the next window starts from, which streaming ingest uses to trim its
+        buffer when final=False.
+        """
+        if self.chunking_mode == "characters":
+            for start, end in iter_windows(text, self.chunk_size, self.chunk_overlap, final):
+                yield (*strip_span(text, start, end), None, next_window_start(start, end, self.chunk_overlap))
+            return
+        
+        encoding = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            verbose=False
+        )
+        input_ids = encoding["input_ids"]
+        offsets = encoding["offset_mapping"]
+        
+        for first, last in iter_token_windows(text, offsets, self.max_tokens, self.overlap_tokens, final):
+            resume_token = next_window_start(first, last, self.overlap_tokens)
+            resume = offsets[resume_token][0] if resume_token < len(offsets) else len(text)
+            yield offsets[first][0], offsets[last - 1][1], input_ids[first:last], resume
+    
+    def chunk_document(self, text: str) -> List[Tuple[int, int, Optional[List[int]]]]:
+        """(char_start, char_end, token_ids) of each chunk of a whole document."""
+        if self.chunking_mode == "characters":
+            return [(start, end, None) for start, end in chunk_spans(text, self.chunk_size, self.chunk_overlap)]
+        
+        chunks = [(start, end, token_ids) for start, end, token_ids, _ in self.iter_chunks(text) if start < end]
+        return chunks or [(0, len(text), None)]
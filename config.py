@@ -17,17 +17,74 @@ class Settings:
     # ChromaDB settings
     CHROMA_PERSIST_DIRECTORY: str = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
     CHROMA_COLLECTION_NAME: str = "documents"
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma" (HNSW) or "numpy" (exact, memory-mapped)
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")  # numpy backend: "none", "int8" or "binary"
+    QUANTIZATION_OVERSAMPLE: int = int(os.getenv("QUANTIZATION_OVERSAMPLE", "8"))  # candidates rescored per result
+    VECTOR_READ_ONLY: bool = os.getenv("VECTOR_READ_ONLY", "false").lower() == "true"  # numpy backend: open as a reader
+    
+    # HNSW index settings (chroma backend), applied when a collection is created
+    HNSW_SPACE: str = os.getenv("HNSW_SPACE", "cosine")  # "cosine", "ip" or "l2"
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))  # graph neighbours per node
+    HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+    HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", "100"))
+    HNSW_SYNC_THRESHOLD: int = int(os.getenv("HNSW_SYNC_THRESHOLD", "1000"))  # vectors indexed before persisting
+    
+    # Hybrid retrieval: BM25 next to the vector index, merged by reciprocal rank fusion
+    HYBRID_SEARCH: bool = os.getenv("HYBRID_SEARCH", "false").lower() == "true"
+    BM25_K1: float = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", "20"))  # results fused from each ranking
+    
+    # Cross-encoder reranking (empty model disables), e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "20"))  # results retrieved and rescored
+    RERANK_BUDGET_MS: float = float(os.getenv("RERANK_BUDGET_MS", "200"))  # fall back to retrieval order past this (0 = no limit)
+    RERANK_MAX_LENGTH: int = int(os.getenv("RERANK_MAX_LENGTH", "512"))  # tokens per (query, chunk) pair
+    RERANK_TOKEN_CACHE_SIZE: int = int(os.getenv("RERANK_TOKEN_CACHE_SIZE", "10000"))  # chunks whose token ids are kept
+    RERANK_WORKERS: int = int(os.getenv("RERANK_WORKERS", "2"))  # cross-encoder scoring threads
     
     # Model settings
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    EMBEDDING_CACHE_PATH: str = os.getenv(
+        "EMBEDDING_CACHE_PATH", os.path.join(CHROMA_PERSIST_DIRECTORY, "embedding_cache.sqlite3")
+    )  # Set to an empty string to disable the cache
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "200000"))
     LLM_MODEL: str = os.getenv("LLM_MODEL", "llama2")
     
     # Document processing
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    CHUNKING_MODE: str = os.getenv("CHUNKING_MODE", "characters")  # "characters" or "tokens"
+    CHUNK_TOKEN_OVERLAP: int = int(os.getenv("CHUNK_TOKEN_OVERLAP", "32"))
+    
+    # Ingest settings
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))
+    CHUNKING_WORKERS: int = int(os.getenv("CHUNKING_WORKERS", "0"))  # 0 chunks in-process
+    INGEST_JOB_HISTORY: int = int(os.getenv("INGEST_JOB_HISTORY", "1000"))
+    INGEST_MAX_PENDING_JOBS: int = int(os.getenv("INGEST_MAX_PENDING_JOBS", "100"))  # further submissions get 429
+    UPLOAD_BLOCK_SIZE: int = int(os.getenv("UPLOAD_BLOCK_SIZE", str(1024 * 1024)))
     
     # Retrieval settings
     SIMILARITY_TOP_K: int = 5
+    QUERY_BATCH_WAIT_MS: float = float(os.getenv("QUERY_BATCH_WAIT_MS", "3"))  # 0 disables micro-batching
+    QUERY_BATCH_MAX_SIZE: int = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+    QUERY_EMBEDDING_CACHE_SIZE: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))  # 0 disables it
+    QUERY_EMBEDDING_CACHE_TTL: float = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))  # seconds, 0 = no expiry
+    QUERY_CASEFOLD: bool = os.getenv("QUERY_CASEFOLD", "true").lower() == "true"
+    QUERY_COLLAPSE_WHITESPACE: bool = os.getenv("QUERY_COLLAPSE_WHITESPACE", "true").lower() == "true"
+    RETRIEVAL_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", "10000"))  # 0 disables it
+    RETRIEVAL_CACHE_TTL: float = float(os.getenv("RETRIEVAL_CACHE_TTL", "60"))  # seconds; bounds staleness from other processes' writes, 0 = no expiry
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "0"))  # opt-in, 0 disables it
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+    ANSWER_CACHE_TTL: float = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds, 0 = until the collection changes
+    QUERY_BATCH_GENERATION_WORKERS: int = int(os.getenv("QUERY_BATCH_GENERATION_WORKERS", "4"))  # LLM calls at once, shared by all /query/batch requests
+    QUERY_SINGLE_FLIGHT: bool = os.getenv("QUERY_SINGLE_FLIGHT", "true").lower() == "true"
+    
+    # Request execution: bounded thread pools for blocking query and ingest work
+    QUERY_WORKERS: int = int(os.getenv("QUERY_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+    INGEST_REQUEST_WORKERS: int = int(os.getenv("INGEST_REQUEST_WORKERS", "2"))
     
     # Optional OpenAI settings (for Agno if using OpenAI models)
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
@@ -0,0 +1,159 @@
+"""Persistent SQLite-backed embedding cache keyed by model name and text hash."""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Size-bounded LRU cache of embedding vectors stored as float32 blobs in SQLite.
+    
+    Lookups are read-only: the last-used time of each hit is kept in memory
+    and written in one batch on the next put_many (just before eviction
+    needs it), once touch_flush_size hits are pending, or on close.
+    """
+    
+    def __init__(self, path: str, model_name: str, max_entries: int = 200_000, touch_flush_size: int = 10_000):
+        """Open (or create) the cache database."""
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.touch_flush_size = touch_flush_size
+        self._touched: Dict[bytes, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        
+        logger.info(f"EmbeddingCache opened at {path} with {self._size} entries")
+    
+    @staticmethod
+    def _hash(text: str) -> bytes:
+        """Digest used as the cache key for a text."""
+        return hashlib.sha256(text.encode("utf-8")).digest()
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up cached vectors; returns None for each text that is not cached."""
+        if not texts:
+            return []
+        
+        hashes = [self._hash(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype=np.float32)
+            
+            if found:
+                now = time.time()
+                for text_hash in found:
+                    self._touched[text_hash] = now
+                if len(self._touched) >= self.touch_flush_size:
+                    self._flush_touched()
+                    self._conn.commit()
+            
+            results = [found.get(text_hash) for text_hash in hashes]
+            hit_count = sum(1 for vector in results if vector is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        
+        return results
+    
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Store vectors for texts, evicting least recently used entries past max_entries."""
+        if not texts:
+            return
+        
+        now = time.time()
+        rows = [
+            (self.model_name, self._hash(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        
+        with self._lock:
+            self._flush_touched()
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._size += self._conn.total_changes - before
+            
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE (model, text_hash) IN "
+                    "(SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,)
+                )
+                self._size -= overflow
+                self.evictions += overflow
+            
+            self._conn.commit()
+    
+    def _flush_touched(self):
+        """Write pending last-used times of hits (caller holds the lock and commits)."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(last_used, self.model_name, text_hash) for text_hash, last_used in self._touched.items()]
+            )
+            self._touched.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "model": self.model_name,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+    
+    def close(self):
+        """Write pending last-used times and close the underlying database connection."""
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
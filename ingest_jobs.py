@@ -0,0 +1,234 @@
+"""Background ingest jobs backed by a bounded worker pool."""
+
+import codecs
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(Exception):
+    """Raised when a job is submitted while max_pending jobs are already queued or running."""
+
+
+class IngestJob:
+    """Progress and timing record for one ingest job.
+    
+    Jobs created with keep_chunk_ids=False (streamed uploads) record counts
+    only, so their history entry does not grow with the size of the file.
+    """
+    
+    def __init__(self, documents_total: int, keep_chunk_ids: bool = True):
+        """Create a queued job."""
+        self.job_id = str(uuid.uuid4())
+        self.status = "queued"
+        self.documents_total = documents_total
+        self.keep_chunk_ids = keep_chunk_ids
+        self.chunks_total = 0
+        self.chunks_skipped = 0
+        self.chunks_embedded = 0
+        self.chunks_written = 0
+        self.document_chunk_ids: List[List[str]] = []
+        self.errors: List[str] = []
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def record_progress(self, stage: str, count: int):
+        """Progress callback passed to the knowledge base."""
+        with self._lock:
+            if stage == "chunked":
+                self.chunks_total += count
+            elif stage == "skipped":
+                self.chunks_skipped += count
+            elif stage == "embedded":
+                self.chunks_embedded += count
+            elif stage == "written":
+                self.chunks_written += count
+    
+    def start(self):
+        """Mark the job as running."""
+        with self._lock:
+            self.status = "running"
+            self.started_at = time.time()
+    
+    def finish(self, document_chunk_ids: Optional[List[List[str]]] = None, error: Optional[str] = None):
+        """Mark the job as completed with its chunk ids, or as failed with error."""
+        with self._lock:
+            if error is None:
+                if self.keep_chunk_ids:
+                    self.document_chunk_ids = document_chunk_ids or []
+                self.status = "completed"
+            else:
+                self.errors.append(error)
+                self.status = "failed"
+            self.finished_at = time.time()
+    
+    def chunk_ids(self) -> Optional[List[List[str]]]:
+        """Chunk ids of each document once the job has completed, else None (always None without keep_chunk_ids)."""
+        with self._lock:
+            return self.document_chunk_ids if self.status == "completed" and self.keep_chunk_ids else None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Snapshot of the job for the status API."""
+        with self._lock:
+            now = time.time()
+            queued_until = self.started_at or now
+            running_until = self.finished_at or now
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "documents_total": self.documents_total,
+                "chunks_total": self.chunks_total,
+                "chunks_skipped": self.chunks_skipped,
+                "chunks_embedded": self.chunks_embedded,
+                "chunks_written": self.chunks_written,
+                "chunk_ids_total": sum(len(ids) for ids in self.document_chunk_ids),
+                "errors": list(self.errors),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "queue_seconds": queued_until - self.created_at,
+                "run_seconds": running_until - self.started_at if self.started_at else 0.0
+            }
+
+
+class IngestJobManager:
+    """Runs knowledge base ingests on a bounded thread pool and tracks their progress.
+    
+    At most max_pending jobs may be queued or running at once; further
+    submissions raise IngestQueueFull instead of piling documents up in
+    memory behind the workers.
+    """
+    
+    def __init__(self, knowledge_base, max_workers: int = 2, max_history: int = 1000, max_pending: int = 100):
+        """Initialize the job manager."""
+        self.knowledge_base = knowledge_base
+        self.max_history = max_history
+        self.max_pending = max_pending
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        logger.info(f"IngestJobManager initialized with {max_workers} workers")
+    
+    def submit(self, documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> IngestJob:
+        """Queue documents for ingest and return the job immediately.
+        
+        Raises IngestQueueFull if max_pending jobs are already queued or running.
+        """
+        job = self._queue(len(documents))
+        self._executor.submit(self._run, job, documents, metadatas)
+        logger.info(f"Queued ingest job {job.job_id} with {len(documents)} documents")
+        return job
+    
+    def submit_stream(self, path: str, metadata: Optional[Dict[str, Any]] = None, block_size: int = 1024 * 1024) -> IngestJob:
+        """Queue a UTF-8 text file for streamed ingest as one document and return the job immediately.
+        
+        The file is read in block_size blocks and fed to a TextStreamIngest,
+        so memory stays bounded regardless of its size; the job keeps chunk
+        counts but not chunk ids. Once queued, the job owns the file and
+        deletes it when done. Raises IngestQueueFull if
+        max_pending jobs are already queued or running.
+        """
+        job = self._queue(1, keep_chunk_ids=False)
+        self._executor.submit(self._run_stream, job, path, metadata, block_size)
+        logger.info(f"Queued streamed ingest job {job.job_id} for {path}")
+        return job
+    
+    def _queue(self, documents_total: int, keep_chunk_ids: bool = True) -> IngestJob:
+        """Register a new queued job, or raise IngestQueueFull."""
+        job = IngestJob(documents_total=documents_total, keep_chunk_ids=keep_chunk_ids)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise IngestQueueFull(f"{self._pending} ingest jobs are already pending")
+            self._pending += 1
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+        return job
+    
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """Look up a job by id."""
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def list_jobs(self) -> List[IngestJob]:
+        """All tracked jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+    
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs and optionally wait for running ones."""
+        self._executor.shutdown(wait=wait)
+    
+    def _run(self, job: IngestJob, documents: List[str], metadatas: Optional[List[Dict[str, Any]]]):
+        """Worker body: ingest the documents and record the outcome on the job."""
+        job.start()
+        try:
+            job.finish(self.knowledge_base.add_text_documents_grouped(
+                documents=documents,
+                metadatas=metadatas,
+                progress=job.record_progress
+            ))
+        except Exception as e:
+            logger.error(f"Ingest job {job.job_id} failed: {e}")
+            job.finish(error=str(e))
+        finally:
+            self._release(job)
+    
+    def _run_stream(self, job: IngestJob, path: str, metadata: Optional[Dict[str, Any]], block_size: int):
+        """Worker body: stream the file into the knowledge base, then delete it.
+        
+        On failure the batch still buffered is dropped; chunks already
+        written stay stored (see TextStreamIngest.abort), and the job's
+        chunks_written says how many.
+        """
+        job.start()
+        stream = None
+        try:
+            stream = self.knowledge_base.open_text_stream(metadata=metadata, progress=job.record_progress)
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            with open(path, "rb") as f:
+                while True:
+                    block = f.read(block_size)
+                    if not block:
+                        break
+                    stream.feed(decoder.decode(block))
+            stream.feed(decoder.decode(b"", final=True))
+            stream.close()
+            job.finish()
+        except Exception as e:
+            if stream is not None:
+                stream.abort()
+            logger.error(f"Streamed ingest job {job.job_id} failed: {e}")
+            job.finish(error=str(e))
+        finally:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Failed to remove upload spool file {path}: {e}")
+            self._release(job)
+    
+    def _release(self, job: IngestJob):
+        """Free the job's pending slot and log its outcome."""
+        with self._lock:
+            self._pending -= 1
+        snapshot = job.to_dict()
+        logger.info(f"Ingest job {job.job_id} {snapshot['status']} in {snapshot['run_seconds']:.2f}s")
+    
+    def _evict_finished(self):
+        """Drop the oldest finished jobs once history exceeds max_history."""
+        if len(self._jobs) <= self.max_history:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]:
+            if len(self._jobs) <= self.max_history:
+                break
+            del self._jobs[job_id]
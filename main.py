@@ -1,16 +1,27 @@
 """FastAPI application for the RAG system."""
 
+import asyncio
+import functools
+import json
 import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import StreamingResponse
+from typing import List, Tuple
 import uvicorn
 from contextlib import asynccontextmanager
 
 from config import settings
 from models import (
     DocumentUpload, QueryRequest, QueryResponse, 
-    DocumentResponse, HealthResponse
+    DocumentResponse, HealthResponse, IngestJobResponse, IngestJobChunksResponse,
+    QueryBatchRequest, QueryBatchResponse, SearchRequest, SearchResponse
 )
 from rag_service import RAGService
 
@@ -24,14 +35,27 @@ logger = logging.getLogger(__name__)
 # Global RAG service instance
 rag_service = None
 
+# Blocking RAG work runs on bounded pools so it never stalls the event loop.
+# Queries and request-path ingest get separate pools so neither can starve
+# the other; stats/health use the default threadpool.
+query_executor = None
+ingest_executor = None
+
+async def run_blocking(executor: ThreadPoolExecutor, func, *args, **kwargs):
+    """Run a blocking call on the given pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan."""
-    global rag_service
+    global rag_service, query_executor, ingest_executor
     
     # Startup
     logger.info("Starting RAG system...")
     try:
+        query_executor = ThreadPoolExecutor(max_workers=settings.QUERY_WORKERS, thread_name_prefix="query")
+        ingest_executor = ThreadPoolExecutor(max_workers=settings.INGEST_REQUEST_WORKERS, thread_name_prefix="ingest-request")
         rag_service = RAGService()
         logger.info("RAG system initialized successfully")
     except Exception as e:
@@ -42,6 +66,10 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down RAG system...")
+    if rag_service is not None:
+        rag_service.shutdown()
+    query_executor.shutdown(wait=True)
+    ingest_executor.shutdown(wait=True)
 
 # Create FastAPI app
 app = FastAPI(
@@ -72,7 +100,7 @@ async def root():
 async def health_check():
     """Health check endpoint."""
     try:
-        stats = rag_service.get_stats()
+        stats = await run_in_threadpool(rag_service.get_stats)
         if stats.get("status") == "error":
             raise HTTPException(status_code=503, detail=stats.get("message"))
         
@@ -88,7 +116,7 @@ async def health_check():
 async def add_document(document: DocumentUpload):
     """Add a single document to the knowledge base."""
     try:
-        result = rag_service.add_document(document)
+        result = await run_blocking(ingest_executor, rag_service.add_document, document)
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
         return result
@@ -96,24 +124,38 @@ async def add_document(document: DocumentUpload):
         logger.error(f"Failed to add document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/documents/batch")
+@app.post("/documents/batch", status_code=202)
 async def add_documents_batch(documents: List[DocumentUpload]):
-    """Add multiple documents to the knowledge base."""
+    """Queue multiple documents for ingest; poll /jobs/{job_id} for progress."""
     try:
         if not documents:
             raise HTTPException(status_code=400, detail="No documents provided")
         
-        result = rag_service.add_documents_batch(documents)
+        result = rag_service.submit_documents(documents)
+        _raise_for_rejected_submit(result)
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to add documents batch: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/documents/upload")
-async def upload_text_file(file: UploadFile = File(...)):
-    """Upload a text file and add it to the knowledge base."""
+@app.post("/documents/upload", status_code=202)
+async def upload_text_file(file: UploadFile = File(...), stream: bool = False):
+    """Upload a text file and queue it for ingest; poll /jobs/{job_id} for progress.
+    
+    With ``stream=true`` the upload is spooled to a temporary file and the job
+    reads it in UPLOAD_BLOCK_SIZE blocks, decoding incrementally and chunking,
+    embedding and writing as it reads, so memory stays bounded for very large
+    files. Streamed chunks carry ``filename``, ``content_type``, ``size``,
+    ``chunk_index``, ``char_start``, ``char_end`` and ``streamed``, but not
+    ``total_chunks`` or ``original_doc_length``, which are unknown until the
+    end of the file. If a streamed job fails (for example on invalid UTF-8),
+    the chunks written before the failure stay stored and uploading the same
+    file again skips them.
+    """
     try:
         # Check file type
         if not file.content_type.startswith('text/'):
@@ -122,30 +164,95 @@ async def upload_text_file(file: UploadFile = File(...)):
                 detail="Only text files are supported"
             )
         
-        # Read file content
-        content = await file.read()
-        text_content = content.decode('utf-8')
-        
-        # Create document with metadata
-        document = DocumentUpload(
-            content=text_content,
-            metadata={
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "size": len(content)
-            }
-        )
+        if stream:
+            result = await _submit_text_file_stream(file)
+        else:
+            # Read and decode file content off the event loop
+            text_content, size = await run_blocking(ingest_executor, _read_text_upload, file.file)
+            
+            # Create document with metadata
+            document = DocumentUpload(
+                content=text_content,
+                metadata={
+                    "filename": file.filename,
+                    "content_type": file.content_type,
+                    "size": size
+                }
+            )
+            
+            result = rag_service.submit_documents([document])
         
-        result = rag_service.add_document(document)
+        _raise_for_rejected_submit(result)
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to upload file: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _submit_text_file_stream(file: UploadFile) -> dict:
+    """Spool an upload to a temporary file and queue it as a streamed ingest job."""
+    # The upload is closed when the request ends, so the job reads its own copy
+    path = await run_blocking(ingest_executor, _spool_upload, file.file)
+    result = rag_service.submit_document_stream(
+        path,
+        metadata={
+            "filename": file.filename,
+            "content_type": file.content_type,
+            "size": os.path.getsize(path)
+        }
+    )
+    if result["status"] != "accepted":
+        os.remove(path)
+    return result
+
+def _read_text_upload(source) -> Tuple[str, int]:
+    """Read a whole uploaded file and decode it as UTF-8; returns the text and the size in bytes."""
+    source.seek(0)
+    content = source.read()
+    return content.decode('utf-8'), len(content)
+
+def _spool_upload(source) -> str:
+    """Copy an uploaded file to a new temporary file in UPLOAD_BLOCK_SIZE blocks and return its path."""
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=".txt")
+    try:
+        with os.fdopen(fd, "wb") as target:
+            source.seek(0)
+            shutil.copyfileobj(source, target, settings.UPLOAD_BLOCK_SIZE)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+def _raise_for_rejected_submit(result: dict):
+    """Turn an ingest submission rejected for a full job queue into 429 Too Many Requests."""
+    if result["status"] == "busy":
+        raise HTTPException(status_code=429, detail=result["message"], headers={"Retry-After": "1"})
+
+@app.get("/jobs/{job_id}", response_model=IngestJobResponse)
+async def get_ingest_job(job_id: str):
+    """Get progress counts, errors and timings of an ingest job."""
+    job = rag_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/jobs/{job_id}/chunks", response_model=IngestJobChunksResponse)
+async def get_ingest_job_chunks(job_id: str):
+    """Get the chunk ids of each document of a completed ingest job."""
+    chunks = rag_service.get_job_chunk_ids(job_id)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if chunks["streamed"]:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} was a streamed upload, which keeps chunk counts only; filter by its filename to find its chunks")
+    if chunks["document_chunk_ids"] is None:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} has not completed")
+    return chunks
+
 @app.post("/query", response_model=QueryResponse)
 async def query_documents(query_request: QueryRequest):
     """Query the knowledge base and get an AI-generated response."""
@@ -153,18 +260,94 @@ async def query_documents(query_request: QueryRequest):
         if not query_request.query.strip():
             raise HTTPException(status_code=400, detail="Query cannot be empty")
         
-        response = rag_service.query(query_request)
+        response = await run_blocking(query_executor, rag_service.query, query_request)
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to process query: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/search", response_model=SearchResponse, response_model_exclude_none=True)
+async def search_documents(search_request: SearchRequest):
+    """Retrieve ranked chunks without running the LLM."""
+    if not search_request.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    
+    try:
+        return await run_blocking(query_executor, rag_service.search, search_request)
+        
+    except Exception as e:
+        logger.error(f"Failed to search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/query/stream")
+async def query_documents_stream(query_request: QueryRequest):
+    """Query the knowledge base and stream the response as Server-Sent Events.
+    
+    Events: "sources" (retrieved chunks), "token" (answer text as it is
+    generated), then "done" (timings) or "error".
+    """
+    if not query_request.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    
+    return StreamingResponse(
+        _sse_events(query_request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _sse_events(query_request: QueryRequest):
+    """Stream a query's events as SSE, advancing the blocking generator on the query pool.
+    
+    If the client disconnects, the generator is told to stop and the
+    in-flight next() is allowed to return before the generator is closed
+    (closing it while a pool thread is still inside it would fail).
+    """
+    cancelled = threading.Event()
+    events = rag_service.query_stream(query_request, cancelled)
+    loop = asyncio.get_running_loop()
+    done = object()
+    pending = None
+    try:
+        while True:
+            pending = loop.run_in_executor(query_executor, next, events, done)
+            # Shielded, so a disconnect leaves the future to wait on below
+            event = await asyncio.shield(pending)
+            pending = None
+            if event is done:
+                break
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    finally:
+        cancelled.set()
+        if pending is not None:
+            await asyncio.wait([pending])
+            if not pending.cancelled():
+                pending.exception()  # retrieve it, so it is not logged as unhandled
+        await run_blocking(query_executor, events.close)
+
+@app.post("/query/batch", response_model=QueryBatchResponse)
+async def query_documents_batch(batch_request: QueryBatchRequest):
+    """Answer many queries with one batched retrieval."""
+    if not batch_request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if any(not query_request.query.strip() for query_request in batch_request.queries):
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    
+    try:
+        responses = await run_blocking(query_executor, rag_service.query_batch, batch_request.queries)
+        return QueryBatchResponse(responses=responses)
+        
+    except Exception as e:
+        logger.error(f"Failed to process query batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/stats")
 async def get_system_stats():
     """Get system statistics and health information."""
     try:
-        stats = rag_service.get_stats()
+        stats = await run_in_threadpool(rag_service.get_stats)
         return stats
     except Exception as e:
         logger.error(f"Failed to get stats: {e}")
@@ -174,7 +357,7 @@ async def get_system_stats():
 async def clear_knowledge_base():
     """Clear all documents from the knowledge base."""
     try:
-        result = rag_service.clear_knowledge_base()
+        result = await run_blocking(ingest_executor, rag_service.clear_knowledge_base)
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
         return result
@@ -1,17 +1,35 @@
 """Pydantic models for API requests and responses."""
 
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Literal, Optional
+from search_filters import validate_where, validate_where_document
 
 class DocumentUpload(BaseModel):
     """Model for document upload request."""
     content: str
     metadata: Optional[dict] = {}
 
-class QueryRequest(BaseModel):
+class FilteredRequest(BaseModel):
+    """Chroma metadata (where) and document content (where_document) filters."""
+    where: Optional[Dict[str, Any]] = None
+    where_document: Optional[Dict[str, Any]] = None
+    
+    @field_validator("where")
+    @classmethod
+    def _check_where(cls, value):
+        return validate_where(value)
+    
+    @field_validator("where_document")
+    @classmethod
+    def _check_where_document(cls, value):
+        return validate_where_document(value)
+
+class QueryRequest(FilteredRequest):
     """Model for query request."""
     query: str
     top_k: Optional[int] = 5
+    ef_search: Optional[int] = Field(None, ge=1)  # HNSW candidate list size for this request
+    rerank_budget_ms: Optional[float] = Field(None, ge=0)  # reranking time limit (0 = none), default RERANK_BUDGET_MS
 
 class DocumentResponse(BaseModel):
     """Model for document response."""
@@ -19,14 +37,68 @@ class DocumentResponse(BaseModel):
     content: str
     metadata: dict
     score: Optional[float] = None
+    rrf_score: Optional[float] = None  # hybrid search fusion score, when enabled
 
 class QueryResponse(BaseModel):
     """Model for query response."""
     answer: str
     sources: List[DocumentResponse]
     query: str
+    cached: bool = False
+
+class QueryBatchRequest(BaseModel):
+    """Model for batch query request."""
+    queries: List[QueryRequest]
+
+class QueryBatchResponse(BaseModel):
+    """Model for batch query response."""
+    responses: List[QueryResponse]
+
+class SearchRequest(FilteredRequest):
+    """Model for retrieval-only search request."""
+    query: str
+    top_k: Optional[int] = 5
+    ef_search: Optional[int] = Field(None, ge=1)  # HNSW candidate list size for this request
+    rerank_budget_ms: Optional[float] = Field(None, ge=0)  # reranking time limit (0 = none), default RERANK_BUDGET_MS
+    include: List[Literal["ids", "scores", "metadata", "content"]] = ["ids", "scores", "metadata", "content"]
+
+class SearchResult(BaseModel):
+    """Model for one search hit; fields not requested in include are omitted."""
+    id: str
+    score: Optional[float] = None
+    rrf_score: Optional[float] = None  # hybrid search fusion score, when enabled
+    distance: Optional[float] = None
+    metadata: Optional[dict] = None
+    content: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    """Model for retrieval-only search response."""
+    query: str
+    results: List[SearchResult]
 
 class HealthResponse(BaseModel):
     """Model for health check response."""
     status: str
     message: str
+
+class IngestJobResponse(BaseModel):
+    """Model for ingest job status response."""
+    job_id: str
+    status: str
+    documents_total: int
+    chunks_total: int
+    chunks_skipped: int = 0
+    chunks_embedded: int
+    chunks_written: int
+    chunk_ids_total: int = 0
+    errors: List[str] = []
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    queue_seconds: float
+    run_seconds: float
+
+class IngestJobChunksResponse(BaseModel):
+    """Model for the chunk ids of a completed ingest job."""
+    job_id: str
+    document_chunk_ids: List[List[str]]
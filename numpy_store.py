@@ -0,0 +1,661 @@
+"""Vector store on a memory-mapped float32 matrix plus a SQLite sidecar, with optional quantized search."""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: the single writer is documented but not enforced
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_COMPARISON_SQL = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+# Upper bound on the (queries x rows) score block computed at once
+_SCORE_BLOCK_ELEMENTS = 16 * 1024 * 1024
+
+# Upper bound on the codes decoded at once while scanning a quantized store
+_CODE_BLOCK_ELEMENTS = 512 * 1024
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# Set bits per byte value, for Hamming distances on NumPy < 2.0 (no bitwise_count)
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Number of set bits in each uint64 element."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    return _POPCOUNT[words.view(np.uint8)].reshape(*words.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def _grow_memmap(path: str, current: Optional[np.memmap], count: int, capacity: int, dtype, width: int) -> np.memmap:
+    """Replace the .npy at path by one with capacity rows, keeping the first count rows."""
+    temporary = path + ".tmp"
+    grown = np.lib.format.open_memmap(temporary, mode="w+", dtype=dtype, shape=(capacity, width))
+    if count:
+        grown[:count] = current[:count]
+    grown.flush()
+    del grown
+    os.replace(temporary, path)
+    # Readers holding the old mapping keep a valid (unlinked) file until they finish
+    return np.load(path, mmap_mode="r+")
+
+
+def _regexp(pattern: str, value: Optional[str]) -> bool:
+    """SQLite REGEXP implementation (X REGEXP Y calls regexp(Y, X))."""
+    return value is not None and re.search(pattern, value) is not None
+
+
+def _where_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma metadata filter into a SQL condition on the metadata JSON column."""
+    key, value = next(iter(where.items()))
+    if key in ("$and", "$or"):
+        parts = [_where_sql(clause) for clause in value]
+        joiner = " AND " if key == "$and" else " OR "
+        return "(" + joiner.join(sql for sql, _ in parts) + ")", [param for _, params in parts for param in params]
+    
+    column = "json_extract(metadata, ?)"
+    path = '$."' + key.replace('"', '\\"') + '"'
+    if not isinstance(value, dict):
+        return f"{column} = ?", [path, value]
+    
+    operator, operand = next(iter(value.items()))
+    if operator in _COMPARISON_SQL:
+        return f"{column} {_COMPARISON_SQL[operator]} ?", [path, operand]
+    placeholders = ", ".join("?" * len(operand))
+    negate = "NOT " if operator == "$nin" else ""
+    return f"{column} {negate}IN ({placeholders})", [path, *operand]
+
+
+def _where_document_sql(where_document: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma document filter into a SQL condition on the document column."""
+    operator, operand = next(iter(where_document.items()))
+    if operator in ("$and", "$or"):
+        parts = [_where_document_sql(clause) for clause in operand]
+        joiner = " AND " if operator == "$and" else " OR "
+        return "(" + joiner.join(sql for sql, _ in parts) + ")", [param for _, params in parts for param in params]
+    
+    sql = {
+        "$contains": "instr(document, ?) > 0",
+        "$not_contains": "instr(document, ?) = 0",
+        "$regex": "document REGEXP ?",
+        "$not_regex": "NOT (document REGEXP ?)"
+    }[operator]
+    return sql, [operand]
+
+
+class NumpyVectorStore:
+    """Collection-compatible store answering queries by exact cosine search.
+    
+    Unit-normalized float32 embeddings live in an .npy file that is memory
+    mapped, so opening the store is instant and the matrix is paged in on
+    demand instead of loaded. Row i of the matrix belongs to row i of the
+    SQLite sidecar, which holds ids, chunk text and metadata and evaluates
+    where/where_document filters.
+    
+    One process writes; any number may read. The writer takes an exclusive
+    lock on the directory (where fcntl exists), and opening a second writer,
+    in another process or this one, fails. Stores opened with
+    read_only=True reject add and clear. Before each count, get and query
+    they take a shared lock, re-read the row count from the sidecar and
+    remap the .npy files if the writer grew or replaced them; the writer
+    holds the same lock exclusively while it changes them. Rows are only
+    appended, so a search that started before a write sees the rows that
+    existed when it started; one that races a clear drops the rows whose
+    records are gone. Threads within a process are safe.
+    
+    Implements the subset of chromadb's Collection API the knowledge base
+    uses (add, get, query, count) with the same result shapes. Distances
+    are cosine distances (1 - cosine similarity).
+    
+    With quantization="int8" (one byte per dimension, scaled per dimension
+    to the stored vectors' range) or "binary" (one sign bit per dimension,
+    compared by Hamming distance), searches scan compact codes instead of
+    the float matrix: 4x or 32x less memory traffic. The top
+    n_results * oversample candidates are then rescored exactly against
+    their float32 rows, which are the only float pages read from disk.
+    """
+    
+    max_batch_size = 5461
+    
+    def __init__(
+        self,
+        path: str,
+        initial_capacity: int = 1024,
+        quantization: str = "none",
+        oversample: int = 8,
+        read_only: bool = False
+    ):
+        """Open (or create) the store in directory path; read_only opens it as a reader."""
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"quantization must be one of {QUANTIZATION_MODES}, got {quantization!r}")
+        
+        self.path = path
+        self.initial_capacity = initial_capacity
+        self.quantization = quantization
+        self.oversample = max(1, oversample)
+        self.read_only = read_only
+        self._matrix_path = os.path.join(path, "embeddings.npy")
+        self._codes_path = os.path.join(path, f"codes_{quantization}.npy")
+        self._codes_meta_path = os.path.join(path, f"codes_{quantization}.json")
+        self._lock = threading.Lock()  # serializes writers and guards the matrix/codes/count state
+        self._db_lock = threading.Lock()  # the sidecar connection is shared by all threads
+        os.makedirs(path, exist_ok=True)
+        
+        # "lock" is held by the writer for as long as it is open; "update.lock" while files change
+        self._lock_file = None
+        if not read_only:
+            self._lock_file = open(os.path.join(path, "lock"), "a")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self._lock_file.close()
+                    raise RuntimeError(
+                        f"NumpyVectorStore at {path} is already open for writing; "
+                        f"open further stores with read_only=True"
+                    )
+        self._update_lock_file = open(os.path.join(path, "update.lock"), "a")
+        
+        self._conn = sqlite3.connect(os.path.join(path, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.create_function("REGEXP", 2, _regexp, deterministic=True)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                document TEXT,
+                metadata TEXT
+            )"""
+        )
+        self._conn.commit()
+        
+        self._matrix: Optional[np.memmap] = None
+        # Quantized codes (and the int8 per-dimension range) mirror the float matrix row for row
+        self._codes: Optional[np.memmap] = None
+        self._int8_low: Optional[np.ndarray] = None
+        self._int8_step: Optional[np.ndarray] = None
+        self._int8_calibrated = 0
+        self._count = 0
+        self._mapped: Optional[Tuple[int, Optional[int]]] = None  # (row count, .npy inode) a reader last mapped
+        
+        if read_only:
+            self._refresh()
+        else:
+            with self._update_lock(exclusive=True):
+                self._count = self._stored_count()
+                if os.path.exists(self._matrix_path):
+                    self._matrix = np.load(self._matrix_path, mmap_mode="r+")
+                if quantization != "none" and self._matrix is not None:
+                    self._load_codes()
+        
+        mode = "reading" if read_only else "writing"
+        logger.info(f"NumpyVectorStore opened at {path} for {mode} with {self._count} vectors (quantization: {quantization})")
+    
+    @contextmanager
+    def _update_lock(self, exclusive: bool):
+        """Hold update.lock: exclusively while the writer changes files, shared while a reader maps them."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._update_lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._update_lock_file, fcntl.LOCK_UN)
+    
+    def _stored_count(self) -> int:
+        """Rows committed to the sidecar (vectors are written before their rows)."""
+        with self._db_lock:
+            return self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+    
+    def _refresh(self):
+        """Reader: pick up rows the writer committed, remapping files it grew, replaced or removed."""
+        if not self.read_only:
+            return
+        # The thread lock also keeps threads from releasing each other's flock on the shared file
+        with self._lock, self._update_lock(exclusive=False):
+            count = self._stored_count()
+            try:
+                inode = os.stat(self._matrix_path).st_ino
+            except FileNotFoundError:
+                inode = None
+            if self._mapped == (count, inode):
+                return
+            
+            self._count = count
+            self._matrix = np.load(self._matrix_path, mmap_mode="r") if inode is not None else None
+            self._codes = None
+            if self.quantization != "none" and self._matrix is not None:
+                self._load_codes()
+            self._mapped = (count, inode)
+    
+    def _check_writable(self):
+        """Raise if the store was opened read-only."""
+        if self.read_only:
+            raise RuntimeError(f"NumpyVectorStore at {self.path} was opened read-only")
+    
+    def count(self) -> int:
+        """Number of stored vectors."""
+        self._refresh()
+        return self._count
+    
+    def _code_width(self, dim: int) -> int:
+        """Columns of the code matrix for dim-dimensional vectors (binary: bytes padded to whole uint64 words)."""
+        return dim if self.quantization == "int8" else (dim + 63) // 64 * 8
+    
+    def _load_codes(self):
+        """Open the quantized codes, rebuilding them if missing or out of date."""
+        meta = {}
+        if os.path.exists(self._codes_meta_path):
+            with open(self._codes_meta_path) as f:
+                meta = json.load(f)
+        if self.quantization == "int8" and "low" in meta:
+            self._int8_low = np.array(meta["low"], dtype=np.float32)
+            self._int8_step = np.array(meta["step"], dtype=np.float32)
+            self._int8_calibrated = meta["calibrated"]
+        
+        if self.read_only:
+            # Codes the writer has not brought up to date are ignored; queries then scan the float matrix
+            if os.path.exists(self._codes_path) and meta.get("count") == self._count:
+                self._codes = np.load(self._codes_path, mmap_mode="r")
+            return
+        
+        if os.path.exists(self._codes_path):
+            self._codes = np.load(self._codes_path, mmap_mode="r+")
+        if self._codes is None or self._codes.shape[0] != self._matrix.shape[0] or meta.get("count") != self._count:
+            # Written by an older run or another quantization mode: recompute from the float matrix
+            width = self._code_width(self._matrix.shape[1])
+            self._codes = _grow_memmap(self._codes_path, None, 0, self._matrix.shape[0], self._code_dtype(), width)
+            self._rebuild_codes(self._count)
+    
+    def _save_codes_meta(self, count: int):
+        """Record how many rows the codes cover (and the int8 range they were made with)."""
+        meta: Dict[str, Any] = {"count": count}
+        if self.quantization == "int8":
+            meta.update(low=self._int8_low.tolist(), step=self._int8_step.tolist(), calibrated=self._int8_calibrated)
+        with open(self._codes_meta_path, "w") as f:
+            json.dump(meta, f)
+    
+    def _code_dtype(self):
+        """dtype of the code matrix."""
+        return np.int8 if self.quantization == "int8" else np.uint8
+    
+    def _encode_codes(self, vectors: np.ndarray) -> np.ndarray:
+        """Quantize unit vectors to int8 codes or packed sign bits."""
+        if self.quantization == "binary":
+            bits = np.packbits(vectors > 0, axis=1)
+            return np.pad(bits, ((0, 0), (0, self._code_width(vectors.shape[1]) - bits.shape[1])))
+        levels = np.rint((vectors - self._int8_low) / self._int8_step)
+        return (np.clip(levels, 0, 255) - 128).astype(np.int8)
+    
+    def _rebuild_codes(self, count: int):
+        """Recompute codes for the first count rows (refitting the int8 range first)."""
+        block = max(1, _SCORE_BLOCK_ELEMENTS // self._matrix.shape[1])
+        if self.quantization == "int8":
+            low = np.full(self._matrix.shape[1], np.inf, dtype=np.float32)
+            high = np.full(self._matrix.shape[1], -np.inf, dtype=np.float32)
+            for start in range(0, count, block):
+                rows = np.asarray(self._matrix[start:min(start + block, count)])
+                low = np.minimum(low, rows.min(axis=0))
+                high = np.maximum(high, rows.max(axis=0))
+            if not count:
+                low, high = np.full_like(low, -1), np.full_like(high, 1)
+            self._int8_low = low
+            self._int8_step = np.maximum((high - low) / 255, 1e-8).astype(np.float32)
+            self._int8_calibrated = count
+        
+        for start in range(0, count, block):
+            end = min(start + block, count)
+            self._codes[start:end] = self._encode_codes(np.asarray(self._matrix[start:end]))
+        self._codes.flush()
+        self._save_codes_meta(count)
+    
+    def _ensure_capacity(self, rows: int, dim: int):
+        """Grow the memory-mapped matrix (and codes) by doubling to hold at least rows vectors."""
+        if self._matrix is not None and self._matrix.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match stored dimension {self._matrix.shape[1]}")
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        
+        new_capacity = max(self.initial_capacity, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        
+        self._matrix = _grow_memmap(self._matrix_path, self._matrix, self._count, new_capacity, np.float32, dim)
+        if self.quantization != "none":
+            self._codes = _grow_memmap(self._codes_path, self._codes, self._count, new_capacity, self._code_dtype(), self._code_width(dim))
+    
+    def add(
+        self,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ):
+        """Append vectors; ids that are already stored are ignored."""
+        self._check_writable()
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        
+        with self._lock, self._update_lock(exclusive=True):
+            existing = set(self._lookup_ids(ids))
+            fresh = []
+            for i, chunk_id in enumerate(ids):
+                if chunk_id not in existing:
+                    existing.add(chunk_id)
+                    fresh.append(i)
+            if not fresh:
+                return
+            
+            # Vectors first: rows past the sidecar's count are invisible until it commits
+            start = self._count
+            self._ensure_capacity(start + len(fresh), vectors.shape[1])
+            self._matrix[start:start + len(fresh)] = vectors[fresh]
+            self._matrix.flush()
+            if self.quantization != "none":
+                end = start + len(fresh)
+                if self.quantization == "int8" and end >= 2 * self._int8_calibrated:
+                    # Refit the per-dimension range each time the store doubles (amortized linear)
+                    self._rebuild_codes(end)
+                else:
+                    self._codes[start:end] = self._encode_codes(vectors[fresh])
+                    self._codes.flush()
+                    self._save_codes_meta(end)
+            
+            with self._db_lock:
+                self._conn.executemany(
+                    "INSERT INTO chunks (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (start + n, ids[i], documents[i], json.dumps(metadatas[i]) if metadatas[i] is not None else None)
+                        for n, i in enumerate(fresh)
+                    ]
+                )
+                self._conn.commit()
+            self._count = start + len(fresh)
+    
+    def _lookup_ids(self, ids: List[str]) -> List[str]:
+        """Which of ids are stored."""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT id FROM chunks WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(ids),)
+            ).fetchall()
+        return [chunk_id for chunk_id, in rows]
+    
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = ("documents", "metadatas")
+    ) -> Dict[str, Any]:
+        """Stored records among ids (all by default) passing the filters, shaped like chromadb's Collection.get."""
+        self._refresh()
+        conditions, params = self._filter_sql(where, where_document)
+        if ids is not None:
+            conditions.insert(0, "id IN (SELECT value FROM json_each(?))")
+            params.insert(0, json.dumps(ids))
+        query = "SELECT id, document, metadata, row FROM chunks"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        query += " ORDER BY row"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset or 0])
+        with self._db_lock:
+            rows = self._conn.execute(query, params).fetchall()
+        embeddings = None
+        if "embeddings" in include:
+            with self._lock:
+                matrix = self._matrix
+            embeddings = matrix[[row for _, _, _, row in rows]] if matrix is not None and rows else np.zeros((0, 0), dtype=np.float32)
+        return {
+            "ids": [chunk_id for chunk_id, _, _, _ in rows],
+            "documents": [document for _, document, _, _ in rows] if "documents" in include else None,
+            "metadatas": [json.loads(metadata) if metadata else None for _, _, metadata, _ in rows] if "metadatas" in include else None,
+            "embeddings": embeddings
+        }
+    
+    @staticmethod
+    def _filter_sql(where: Optional[Dict[str, Any]], where_document: Optional[Dict[str, Any]]) -> Tuple[List[str], List[Any]]:
+        """SQL conditions and parameters for the metadata and document filters."""
+        conditions, params = [], []
+        if where:
+            sql, where_params = _where_sql(where)
+            conditions.append(sql)
+            params.extend(where_params)
+        if where_document:
+            sql, document_params = _where_document_sql(where_document)
+            conditions.append(sql)
+            params.extend(document_params)
+        return conditions, params
+    
+    def _candidate_rows(self, where: Optional[Dict[str, Any]], where_document: Optional[Dict[str, Any]], count: int) -> Optional[np.ndarray]:
+        """Rows passing the filters, or None when there are no filters."""
+        conditions, params = self._filter_sql(where, where_document)
+        if not conditions:
+            return None
+        
+        query = f"SELECT row FROM chunks WHERE row < ? AND {' AND '.join(conditions)} ORDER BY row"
+        with self._db_lock:
+            rows = self._conn.execute(query, [count, *params]).fetchall()
+        return np.fromiter((row for row, in rows), dtype=np.int64, count=len(rows))
+    
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances")
+    ) -> Dict[str, Any]:
+        """Exact top-n_results by cosine similarity, shaped like chromadb's Collection.query.
+        
+        All queries are scored with one matrix product (in blocks of queries
+        to bound memory); np.argpartition selects each query's top rows
+        without sorting the rest.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        
+        self._refresh()
+        with self._lock:
+            count = self._count
+            matrix = self._matrix
+            codes = self._codes
+            int8_step = self._int8_step
+        rows = self._candidate_rows(where, where_document, count)
+        
+        if matrix is None or count == 0 or (rows is not None and len(rows) == 0):
+            top_rows = [np.zeros(0, dtype=np.int64)] * len(queries)
+            top_scores = [np.zeros(0, dtype=np.float32)] * len(queries)
+        elif self.quantization == "none" or codes is None:
+            top_rows, top_scores = self._exact_top(queries, matrix, count, rows, n_results)
+        else:
+            top_rows, top_scores = self._quantized_top(queries, matrix, codes, int8_step, count, rows, n_results)
+        
+        selected_rows = np.unique(np.concatenate(top_rows)) if top_rows else []
+        records = self._records(selected_rows, include)
+        if len(records) < len(selected_rows):
+            # A reader raced a clear: drop rows whose records are gone
+            kept = [np.isin(selected, list(records)) for selected in top_rows]
+            top_rows = [selected[keep] for selected, keep in zip(top_rows, kept)]
+            top_scores = [scores[keep] for scores, keep in zip(top_scores, kept)]
+        result = {
+            "ids": [[records[row][0] for row in selected] for selected in top_rows],
+            "documents": None,
+            "metadatas": None,
+            "distances": None
+        }
+        if "documents" in include:
+            result["documents"] = [[records[row][1] for row in selected] for selected in top_rows]
+        if "metadatas" in include:
+            result["metadatas"] = [[records[row][2] for row in selected] for selected in top_rows]
+        if "distances" in include:
+            result["distances"] = [(1 - scores).tolist() for scores in top_scores]
+        return result
+    
+    @staticmethod
+    def _exact_top(
+        queries: np.ndarray,
+        matrix: np.ndarray,
+        count: int,
+        rows: Optional[np.ndarray],
+        n_results: int
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Each query's top rows and cosine similarities by scanning the float matrix."""
+        top_rows: List[np.ndarray] = []
+        top_scores: List[np.ndarray] = []
+        vectors = matrix[:count] if rows is None else matrix[rows]
+        k = min(n_results, len(vectors))
+        block = max(1, _SCORE_BLOCK_ELEMENTS // len(vectors))
+        for start in range(0, len(queries), block):
+            # (queries x rows): each query's scores are contiguous for argpartition
+            scores = queries[start:start + block] @ vectors.T
+            if k < len(vectors):
+                candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                candidates = np.broadcast_to(np.arange(len(vectors)), scores.shape)
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+            order = np.argsort(-candidate_scores, axis=1, kind="stable")
+            ranked = np.take_along_axis(candidates, order, axis=1)
+            ranked_scores = np.take_along_axis(candidate_scores, order, axis=1)
+            for selected, selected_scores in zip(ranked, ranked_scores):
+                top_rows.append(selected if rows is None else rows[selected])
+                top_scores.append(selected_scores)
+        return top_rows, top_scores
+    
+    def _quantized_top(
+        self,
+        queries: np.ndarray,
+        matrix: np.ndarray,
+        codes: np.ndarray,
+        int8_step: Optional[np.ndarray],
+        count: int,
+        rows: Optional[np.ndarray],
+        n_results: int
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Each query's top rows: shortlist on the codes, then rescore the shortlist exactly."""
+        candidate_rows = np.arange(count) if rows is None else rows
+        shortlist = min(len(candidate_rows), n_results * self.oversample)
+        
+        if self.quantization == "int8":
+            # q . x ranks like (q * step) . code, since x ~= low + (code + 128) * step
+            weighted = queries * int8_step
+        else:
+            query_words = self._encode_codes(queries).view(np.uint64)
+        
+        # Approximate scores for a block of queries against every candidate row, then one partition
+        best_rows = []
+        query_block = max(1, _SCORE_BLOCK_ELEMENTS // len(candidate_rows))
+        for query_start in range(0, len(queries), query_block):
+            query_end = min(query_start + query_block, len(queries))
+            scores = np.empty((query_end - query_start, len(candidate_rows)), dtype=np.float32)
+            # Row blocks small enough that decoded codes stay in cache
+            row_block = max(1, _CODE_BLOCK_ELEMENTS // (codes.shape[1] * (query_end - query_start)))
+            for start in range(0, len(candidate_rows), row_block):
+                end = min(start + row_block, len(candidate_rows))
+                block_codes = codes[start:end] if rows is None else codes[candidate_rows[start:end]]
+                if self.quantization == "int8":
+                    scores[:, start:end] = weighted[query_start:query_end] @ block_codes.astype(np.float32).T
+                else:
+                    # Negated Hamming distance (XOR + popcount on 64-bit words), so higher is better in both modes
+                    block_words = np.ascontiguousarray(block_codes).view(np.uint64)
+                    differing = _popcount(block_words[None, :, :] ^ query_words[query_start:query_end, None, :])
+                    scores[:, start:end] = -differing.sum(axis=2, dtype=np.int32)
+            
+            if shortlist < len(candidate_rows):
+                selected = np.argpartition(-scores, shortlist - 1, axis=1)[:, :shortlist]
+            else:
+                selected = np.broadcast_to(np.arange(len(candidate_rows)), scores.shape)
+            best_rows.extend(candidate_rows[selected])
+        
+        # Rescore the shortlist against full-precision vectors
+        top_rows: List[np.ndarray] = []
+        top_scores: List[np.ndarray] = []
+        for query, shortlisted in zip(queries, best_rows):
+            shortlisted = np.sort(shortlisted)
+            exact = np.asarray(matrix[shortlisted]) @ query
+            order = np.argsort(-exact, kind="stable")[:n_results]
+            top_rows.append(shortlisted[order])
+            top_scores.append(exact[order])
+        return top_rows, top_scores
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Vector count, quantization and bytes scanned per query versus full precision."""
+        self._refresh()
+        dim = self._matrix.shape[1] if self._matrix is not None else 0
+        float_bytes = self._count * dim * 4
+        code_bytes = self._count * self._code_width(dim) if self.quantization != "none" and dim else 0
+        return {
+            "vectors": self._count,
+            "dimension": dim,
+            "quantization": self.quantization,
+            "oversample": self.oversample if self.quantization != "none" else None,
+            "float32_bytes": float_bytes,
+            "code_bytes": code_bytes,
+            "scan_bytes": code_bytes if self.quantization != "none" else float_bytes
+        }
+    
+    def _records(self, rows: Sequence[int], include: Sequence[str]) -> Dict[int, Tuple[str, Optional[str], Optional[Dict[str, Any]]]]:
+        """(id, document, metadata) of each row, reading only the included columns."""
+        if len(rows) == 0:
+            return {}
+        document = "document" if "documents" in include else "NULL"
+        metadata = "metadata" if "metadatas" in include else "NULL"
+        with self._db_lock:
+            fetched = self._conn.execute(
+                f"SELECT row, id, {document}, {metadata} FROM chunks WHERE row IN (SELECT value FROM json_each(?))",
+                (json.dumps([int(row) for row in rows]),)
+            ).fetchall()
+        return {
+            row: (chunk_id, text, json.loads(meta) if meta else None)
+            for row, chunk_id, text, meta in fetched
+        }
+    
+    def clear(self):
+        """Delete every vector and record."""
+        self._check_writable()
+        with self._lock, self._update_lock(exclusive=True), self._db_lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+            self._matrix = None
+            self._codes = None
+            self._int8_low = self._int8_step = None
+            self._int8_calibrated = 0
+            self._count = 0
+            for path in (self._matrix_path, self._codes_path, self._codes_meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def close(self):
+        """Close the sidecar database, release the mapping and the directory lock."""
+        with self._lock, self._db_lock:
+            self._matrix = None
+            self._codes = None
+            self._conn.close()
+            self._update_lock_file.close()
+            if self._lock_file is not None:
+                self._lock_file.close()
@@ -0,0 +1,154 @@
+"""Process-pool chunking and tokenization for bulk ingest."""
+
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from chunking import Chunker
+
+logger = logging.getLogger(__name__)
+
+# Per-process chunker, installed once by the pool initializer
+_worker_chunker: Optional[Chunker] = None
+
+
+def _init_worker(chunker: Chunker):
+    """Pool initializer: keep the chunker (and its tokenizer) for every task."""
+    global _worker_chunker
+    _worker_chunker = chunker
+
+
+def _chunk_shared_documents(shm_name: str, ranges: List[Tuple[int, int]]) -> List[Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]]:
+    """Chunk a group of documents read from shared memory by (offset, length).
+    
+    For each document, returns the (n, 2) character spans and, in token mode,
+    all token ids concatenated plus the token count of each chunk. Flat NumPy
+    arrays pickle as single buffers, so the results cross back cheaply.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        texts = [bytes(shm.buf[offset:offset + length]).decode("utf-8") for offset, length in ranges]
+    finally:
+        shm.close()
+    
+    results = []
+    for text in texts:
+        chunks = _worker_chunker.chunk_document(text)
+        spans = np.array([(start, end) for start, end, _ in chunks], dtype=np.int64).reshape(-1, 2)
+        if _worker_chunker.chunking_mode != "tokens":
+            results.append((spans, None, None))
+            continue
+        
+        counts = np.array([len(token_ids or []) for _, _, token_ids in chunks], dtype=np.int32)
+        token_ids = np.fromiter(
+            (token_id for _, _, ids in chunks for token_id in (ids or [])),
+            dtype=np.int32,
+            count=int(counts.sum())
+        )
+        results.append((spans, token_ids, counts))
+    return results
+
+
+class ParallelChunker:
+    """Chunks and tokenizes documents on a pool of worker processes.
+    
+    Document text is copied once into a shared memory block that workers
+    read by offset, instead of being pickled per task. Small documents are
+    grouped into tasks of about task_bytes to amortize the per-task round
+    trip. Results are yielded in document order as soon as they are ready,
+    with a bounded number of tasks in flight, so embedding can start before
+    chunking finishes.
+    
+    Workers are spawned on first use and then kept, so their start-up cost
+    (importing the tokenizer stack) is paid once per process lifetime.
+    Concurrent ingest jobs share the one pool. The shared memory block of a
+    chunk_documents() call is unlinked when its generator finishes or is
+    closed, so consumers that may stop early should close it.
+    """
+    
+    def __init__(self, chunker: Chunker, max_workers: int = 4, task_bytes: int = 256 * 1024):
+        """Initialize the pool (workers start lazily on first use)."""
+        self.chunker = chunker
+        self.max_workers = max_workers
+        self.task_bytes = task_bytes
+        self.max_in_flight = max_workers * 4
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the process pool on first use (once, even when jobs start concurrently)."""
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs torch threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.chunker,)
+                )
+                logger.info(f"ParallelChunker started {self.max_workers} worker processes")
+            return self._executor
+    
+    def chunk_documents(self, documents: List[str]) -> Iterator[List[Tuple[int, int, Optional[List[int]]]]]:
+        """Yield chunk_document() results for each document, in order."""
+        encoded = [document.encode("utf-8") for document in documents]
+        total = sum(len(data) for data in encoded)
+        shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        pending = deque()
+        
+        try:
+            # Group consecutive documents into tasks of roughly task_bytes
+            tasks: List[List[Tuple[int, int]]] = [[]]
+            task_size = 0
+            position = 0
+            for data in encoded:
+                shm.buf[position:position + len(data)] = data
+                if task_size >= self.task_bytes:
+                    tasks.append([])
+                    task_size = 0
+                tasks[-1].append((position, len(data)))
+                task_size += len(data)
+                position += len(data)
+            del encoded
+            
+            executor = self._get_executor()
+            next_task = 0
+            while next_task < len(tasks) or pending:
+                while next_task < len(tasks) and len(pending) < self.max_in_flight:
+                    pending.append(executor.submit(_chunk_shared_documents, shm.name, tasks[next_task]))
+                    next_task += 1
+                
+                for spans, token_ids, counts in pending.popleft().result():
+                    yield self._unpack(spans, token_ids, counts)
+        finally:
+            for future in pending:
+                future.cancel()
+            shm.close()
+            shm.unlink()
+    
+    @staticmethod
+    def _unpack(spans: np.ndarray, token_ids: Optional[np.ndarray], counts: Optional[np.ndarray]) -> List[Tuple[int, int, Optional[List[int]]]]:
+        """Turn a worker's flat arrays back into chunk_document() tuples."""
+        if token_ids is None:
+            return [(int(start), int(end), None) for start, end in spans]
+        
+        chunks = []
+        position = 0
+        for (start, end), count in zip(spans, counts):
+            ids = token_ids[position:position + count].tolist() if count else None
+            chunks.append((int(start), int(end), ids))
+            position += count
+        return chunks
+    
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
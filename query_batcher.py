@@ -0,0 +1,142 @@
+"""Micro-batching of query embeddings across concurrent requests."""
+
+import bisect
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Fixed-bucket histogram; bucket i counts observations <= buckets[i]."""
+    
+    def __init__(self, buckets: Sequence[float]):
+        """Initialize empty counts, with a final overflow bucket."""
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+    
+    def observe(self, value: float):
+        """Record one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Bucket counts keyed by upper bound ("+Inf" for the overflow bucket)."""
+        labels = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class QueryEmbeddingBatcher:
+    """Collects concurrent query texts and embeds them in one model call.
+    
+    Callers block in embed() while a single worker thread gathers requests,
+    runs encode on the whole batch and hands each caller its own vector. A
+    query that finds nothing else queued is encoded at once, so an idle
+    server adds no latency. When others are already queued (concurrent
+    load), the worker takes them all and waits up to max_wait_ms more for
+    stragglers, up to max_batch_size. Queries also pile up while a batch is
+    being encoded, so under load many one-sentence forward passes become a
+    few batched ones.
+    """
+    
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch_size: int = 32, max_wait_ms: float = 3.0):
+        """Start the batching worker thread."""
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_ms = Histogram(WAIT_MS_BUCKETS)
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+        self._worker.start()
+    
+    def embed(self, text: str) -> np.ndarray:
+        """Embedding of one query text, computed in a shared batch."""
+        future: Future = Future()
+        # Checked and queued under the lock, so close() cannot slip in between
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("QueryEmbeddingBatcher is closed")
+            self._queue.put((text, time.perf_counter(), future))
+        return future.result()
+    
+    def _run(self):
+        """Worker loop: gather a batch, encode it, resolve the callers' futures."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            batch = [item]
+            # Nothing else waiting: dispatch now rather than idle for the window
+            wait = self.max_wait if self._queue.qsize() else 0.0
+            deadline = time.perf_counter() + wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            
+            self._encode_batch(batch)
+    
+    def _encode_batch(self, batch: List[tuple]):
+        """Encode one gathered batch and deliver the vectors (or the error)."""
+        started = time.perf_counter()
+        with self._lock:
+            self.batch_sizes.observe(len(batch))
+            for _, enqueued, _ in batch:
+                self.wait_ms.observe((started - enqueued) * 1000)
+        
+        try:
+            vectors = self.encode([text for text, _, _ in batch])
+        except Exception as e:
+            logger.error(f"Failed to encode query batch of {len(batch)}: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for (_, _, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Batch size and queue wait time (ms) histograms."""
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batch_size": self.batch_sizes.snapshot(),
+                "wait_ms": self.wait_ms.snapshot()
+            }
+    
+    def close(self):
+        """Stop the worker after it finishes the queries already queued."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # Every query accepted by embed() is queued before this sentinel
+            self._queue.put(None)
+        self._worker.join()
@@ -0,0 +1,247 @@
+"""In-process caches and request coalescing for the query path."""
+
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str, casefold: bool = True, collapse_whitespace: bool = True) -> str:
+    """Canonical form of a query, so trivially different spellings share cache entries."""
+    if collapse_whitespace:
+        text = _WHITESPACE.sub(" ", text).strip()
+    if casefold:
+        text = text.casefold()
+    return text
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire ttl_seconds after insertion.
+    
+    ttl_seconds <= 0 keeps entries until they are evicted by size.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float = 0.0):
+        """Initialize an empty cache."""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for key, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, expires_at = entry
+            if expires_at and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: Any):
+        """Store value under key, evicting the least recently used entries past max_entries."""
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop all entries (statistics are kept)."""
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Size, hit/miss counts and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class SemanticAnswerCache:
+    """Generated answers reused for paraphrased questions over the same sources.
+    
+    An entry stores the question's embedding, the ids of the chunks that
+    were retrieved for it and the generated answer. A later question is
+    served from the entry when it retrieved exactly the same chunk set and
+    its embedding has cosine similarity >= threshold with the stored one,
+    so the answer is grounded in identical context. Entries are bounded
+    (LRU), expire after ttl_seconds (0 = never) and are dropped as soon as
+    the collection generation changes.
+    """
+    
+    def __init__(self, max_entries: int, threshold: float = 0.95, ttl_seconds: float = 0.0):
+        """Initialize an empty cache."""
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._by_sources: Dict[FrozenSet[str], Set[int]] = {}
+        self._next_id = itertools.count()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        """Embedding scaled to unit length, so a dot product is the cosine."""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(embedding))
+        return embedding / norm if norm else embedding
+    
+    def _sync_generation(self, generation: int):
+        """Drop every entry if the collection changed since they were stored."""
+        if generation > self.generation:
+            self._entries.clear()
+            self._by_sources.clear()
+            self.generation = generation
+    
+    def _remove(self, entry_id: int):
+        """Remove one entry and its source index reference."""
+        _, sources, _, _ = self._entries.pop(entry_id)
+        ids = self._by_sources[sources]
+        ids.discard(entry_id)
+        if not ids:
+            del self._by_sources[sources]
+    
+    def get(self, embedding: np.ndarray, source_ids: Iterable[str], generation: int) -> Optional[Any]:
+        """Cached answer for a question with this embedding and retrieved chunk set, or None."""
+        query = self._unit(embedding)
+        sources = frozenset(source_ids)
+        now = time.monotonic()
+        with self._lock:
+            self._sync_generation(generation)
+            if generation < self.generation:
+                self.misses += 1
+                return None
+            
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_sources.get(sources, ())):
+                vector, _, answer, expires_at = self._entries[entry_id]
+                if expires_at and expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(query, vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            
+            if best_id is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+    
+    def put(self, embedding: np.ndarray, source_ids: Iterable[str], answer: Any, generation: int):
+        """Store the answer generated for a question over the given chunks."""
+        sources = frozenset(source_ids)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+        with self._lock:
+            if generation < self.generation:
+                return
+            self._sync_generation(generation)
+            entry_id = next(self._next_id)
+            self._entries[entry_id] = (self._unit(embedding), sources, answer, expires_at)
+            self._by_sources.setdefault(sources, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Size, hit/miss counts and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation.
+    
+    The first caller for a key runs the function; callers that arrive while
+    it is running wait for it and receive the same result (or exception).
+    Nothing is kept once the call finishes, so this never serves stale
+    results; it only absorbs bursts of identical in-flight requests.
+    """
+    
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self.computed = 0
+        self.coalesced = 0
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Result of func() for key and whether it was shared from another caller's call."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.computed += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            return future.result(), True
+        
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Calls computed, calls coalesced onto them and how many are in flight now."""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "computed": self.computed,
+                "coalesced": self.coalesced
+            }
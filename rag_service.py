@@ -1,11 +1,18 @@
 """Main RAG service using Agno framework with true agentic RAG."""
 
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Union
 from agno.agent import Agent
 from agno.models.ollama import Ollama
 from agno_knowledge import AgnoRAGKnowledgeBase
-from models import DocumentUpload, QueryRequest, QueryResponse, DocumentResponse
+from ingest_jobs import IngestJobManager, IngestQueueFull
+from query_cache import SemanticAnswerCache, SingleFlight
+from reranker import CrossEncoderReranker
+from search_filters import filter_key
+from models import DocumentUpload, QueryRequest, QueryResponse, DocumentResponse, SearchRequest
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -20,7 +27,72 @@ class RAGService:
             path=settings.CHROMA_PERSIST_DIRECTORY,
             collection_name=settings.CHROMA_COLLECTION_NAME,
             chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP
+            chunk_overlap=settings.CHUNK_OVERLAP,
+            embedding_batch_size=settings.EMBEDDING_BATCH_SIZE,
+            embedding_model=settings.EMBEDDING_MODEL,
+            embedding_cache_path=settings.EMBEDDING_CACHE_PATH or None,
+            embedding_cache_size=settings.EMBEDDING_CACHE_SIZE,
+            chunking_mode=settings.CHUNKING_MODE,
+            chunk_token_overlap=settings.CHUNK_TOKEN_OVERLAP,
+            chunking_workers=settings.CHUNKING_WORKERS,
+            query_batch_wait_ms=settings.QUERY_BATCH_WAIT_MS,
+            query_batch_max_size=settings.QUERY_BATCH_MAX_SIZE,
+            query_cache_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+            query_cache_ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+            query_casefold=settings.QUERY_CASEFOLD,
+            query_collapse_whitespace=settings.QUERY_COLLAPSE_WHITESPACE,
+            retrieval_cache_size=settings.RETRIEVAL_CACHE_SIZE,
+            retrieval_cache_ttl=settings.RETRIEVAL_CACHE_TTL,
+            vector_backend=settings.VECTOR_BACKEND,
+            vector_quantization=settings.VECTOR_QUANTIZATION,
+            quantization_oversample=settings.QUANTIZATION_OVERSAMPLE,
+            vector_read_only=settings.VECTOR_READ_ONLY,
+            hnsw_space=settings.HNSW_SPACE,
+            hnsw_m=settings.HNSW_M,
+            hnsw_ef_construction=settings.HNSW_EF_CONSTRUCTION,
+            hnsw_ef_search=settings.HNSW_EF_SEARCH,
+            hnsw_sync_threshold=settings.HNSW_SYNC_THRESHOLD,
+            hybrid_search=settings.HYBRID_SEARCH,
+            bm25_k1=settings.BM25_K1,
+            bm25_b=settings.BM25_B,
+            rrf_k=settings.RRF_K,
+            hybrid_candidates=settings.HYBRID_CANDIDATES
+        )
+        
+        # Background ingest jobs share the knowledge base
+        self.ingest_jobs = IngestJobManager(
+            self.knowledge_base,
+            max_workers=settings.INGEST_WORKERS,
+            max_history=settings.INGEST_JOB_HISTORY,
+            max_pending=settings.INGEST_MAX_PENDING_JOBS
+        )
+        
+        # Generated answers reused for paraphrased questions (optional)
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_SIZE > 0:
+            self.answer_cache = SemanticAnswerCache(
+                max_entries=settings.ANSWER_CACHE_SIZE,
+                threshold=settings.ANSWER_CACHE_THRESHOLD,
+                ttl_seconds=settings.ANSWER_CACHE_TTL
+            )
+        
+        # Cross-encoder reordering of an over-fetched candidate list (optional)
+        self.reranker = None
+        if settings.RERANK_MODEL:
+            self.reranker = CrossEncoderReranker(
+                settings.RERANK_MODEL,
+                max_length=settings.RERANK_MAX_LENGTH,
+                token_cache_size=settings.RERANK_TOKEN_CACHE_SIZE,
+                workers=settings.RERANK_WORKERS
+            )
+        
+        # Concurrent identical queries share one retrieval and generation (optional)
+        self.single_flight = SingleFlight() if settings.QUERY_SINGLE_FLIGHT else None
+        
+        # LLM generations of /query/batch requests, shared by all batches
+        self.generation_executor = ThreadPoolExecutor(
+            max_workers=settings.QUERY_BATCH_GENERATION_WORKERS,
+            thread_name_prefix="query-batch"
         )
         
         # Initialize Agno agent
@@ -68,51 +140,200 @@ class RAGService:
                 "message": f"Failed to add document: {str(e)}"
             }
     
-    def add_documents_batch(self, documents: List[DocumentUpload]) -> Dict[str, Any]:
-        """Add multiple documents to the knowledge base."""
+    def submit_documents(self, documents: List[DocumentUpload]) -> Dict[str, Any]:
+        """Queue documents for background ingest and return the job id immediately."""
         try:
-            contents = [doc.content for doc in documents]
-            metadatas = [doc.metadata for doc in documents]
-            
-            doc_ids = self.knowledge_base.add_text_documents(
-                documents=contents,
-                metadatas=metadatas
+            job = self.ingest_jobs.submit(
+                documents=[doc.content for doc in documents],
+                metadatas=[doc.metadata for doc in documents]
             )
             
             return {
-                "status": "success",
-                "message": f"Added {len(documents)} documents successfully",
-                "document_ids": doc_ids,
-                "total_chunks_created": len(doc_ids)
+                "status": "accepted",
+                "message": f"Queued {len(documents)} documents for ingest",
+                "job_id": job.job_id,
+                "status_url": f"/jobs/{job.job_id}"
             }
             
+        except IngestQueueFull as e:
+            logger.warning(f"Rejected ingest job: {e}")
+            return {
+                "status": "busy",
+                "message": f"Too many pending ingest jobs, retry later: {str(e)}"
+            }
         except Exception as e:
-            logger.error(f"Failed to add documents batch: {e}")
+            logger.error(f"Failed to submit ingest job: {e}")
             return {
                 "status": "error",
-                "message": f"Failed to add documents: {str(e)}"
+                "message": f"Failed to submit ingest job: {str(e)}"
             }
     
+    def submit_document_stream(self, path: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Queue a text file for streamed background ingest (see IngestJobManager.submit_stream).
+        
+        The job takes ownership of the file only if the status is "accepted".
+        """
+        try:
+            job = self.ingest_jobs.submit_stream(path, metadata=metadata, block_size=settings.UPLOAD_BLOCK_SIZE)
+            
+            return {
+                "status": "accepted",
+                "message": "Queued file for streamed ingest",
+                "job_id": job.job_id,
+                "status_url": f"/jobs/{job.job_id}"
+            }
+            
+        except IngestQueueFull as e:
+            logger.warning(f"Rejected ingest job: {e}")
+            return {
+                "status": "busy",
+                "message": f"Too many pending ingest jobs, retry later: {str(e)}"
+            }
+        except Exception as e:
+            logger.error(f"Failed to submit ingest job: {e}")
+            return {
+                "status": "error",
+                "message": f"Failed to submit ingest job: {str(e)}"
+            }
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the progress of an ingest job, or None if it is unknown."""
+        job = self.ingest_jobs.get(job_id)
+        return job.to_dict() if job else None
+    
+    def get_job_chunk_ids(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the chunk ids of an ingest job, or None if it is unknown.
+        
+        ``document_chunk_ids`` is None until the job has completed, and
+        always for streamed jobs (``streamed``), which keep counts only.
+        """
+        job = self.ingest_jobs.get(job_id)
+        if job is None:
+            return None
+        return {"job_id": job.job_id, "document_chunk_ids": job.chunk_ids(), "streamed": not job.keep_chunk_ids}
+    
     def query(self, query_request: QueryRequest) -> QueryResponse:
+        """Process a query with RAG, sharing the work of identical concurrent queries."""
+        if self.single_flight is None:
+            return self._answer_query(query_request)
+        
+        response, shared = self.single_flight.do(self._query_key(query_request), lambda: self._answer_query(query_request))
+        if shared:
+            # Echo each caller's own query text
+            response = response.model_copy(update={"query": query_request.query})
+        return response
+    
+    def _query_key(self, query_request: QueryRequest) -> tuple:
+        """Key under which queries count as identical: same answer for the same inputs."""
+        return (
+            self.knowledge_base.normalize_query(query_request.query),
+            query_request.top_k,
+            query_request.ef_search,
+            query_request.rerank_budget_ms,
+            filter_key(query_request.where, query_request.where_document),
+            settings.LLM_MODEL if self.llm_available else None
+        )
+    
+    def _answer_query(self, query_request: QueryRequest) -> QueryResponse:
         """Process a query with RAG - retrieve context and generate response."""
+        # Retrieve relevant documents from knowledge base
+        generation = self.knowledge_base.generation
+        retrieved_docs = self._retrieve(query_request)
+        return self._respond(query_request, retrieved_docs, generation)
+    
+    def search(self, search_request: SearchRequest) -> Dict[str, Any]:
+        """Retrieve ranked chunks without generating an answer."""
+        results = self._retrieve(search_request, search_request.include)
+        return {
+            "query": search_request.query,
+            "results": results
+        }
+    
+    def _candidate_count(self, request: Union[QueryRequest, SearchRequest]) -> int:
+        """How many results to retrieve for a request: top_k, or the reranker's candidate list."""
+        if self.reranker is None:
+            return request.top_k
+        return max(request.top_k, settings.RERANK_CANDIDATES)
+    
+    def _retrieve(self, request: Union[QueryRequest, SearchRequest], include: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Search for a request's query, reranked when a reranker is configured.
+        
+        The reranker needs chunk content, so with it candidates are fetched
+        in full and projected onto include afterwards.
+        """
+        candidates = self.knowledge_base.search(
+            query=request.query,
+            limit=self._candidate_count(request),
+            include=include if self.reranker is None else None,
+            where=request.where,
+            where_document=request.where_document,
+            ef_search=request.ef_search
+        )
+        results = self._rerank(request, candidates)
+        if self.reranker is None or include is None:
+            return results
+        return [self._project(result, include) for result in results]
+    
+    def _rerank(self, request: Union[QueryRequest, SearchRequest], candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The request's top_k candidates, reordered by the cross-encoder within its time budget."""
+        if self.reranker is None:
+            return candidates[:request.top_k]
+        budget_ms = settings.RERANK_BUDGET_MS if request.rerank_budget_ms is None else request.rerank_budget_ms
+        return self.reranker.rerank(request.query, candidates, request.top_k, budget_ms)
+    
+    @staticmethod
+    def _project(result: Dict[str, Any], include: Sequence[str]) -> Dict[str, Any]:
+        """A search result with only the included fields."""
+        keys = {"id"}
+        if "scores" in include:
+            keys.update(("score", "rrf_score", "distance"))
+        if "metadata" in include:
+            keys.add("metadata")
+        if "content" in include:
+            keys.add("content")
+        return {key: value for key, value in result.items() if key in keys}
+    
+    def query_batch(self, query_requests: List[QueryRequest]) -> List[QueryResponse]:
+        """Process many queries: one batched retrieval, then generation with bounded concurrency.
+        
+        Queries identical under the single-flight key are retrieved and
+        answered once. Generations run on the service's shared pool of
+        QUERY_BATCH_GENERATION_WORKERS threads.
+        """
+        keys = [self._query_key(query_request) for query_request in query_requests]
+        first_index = {}
+        for i, key in enumerate(keys):
+            first_index.setdefault(key, i)
+        unique = [query_requests[i] for i in first_index.values()]
+        
+        generation = self.knowledge_base.generation
+        retrieved = self.knowledge_base.search_batch(
+            queries=[query_request.query for query_request in unique],
+            limits=[self._candidate_count(query_request) for query_request in unique],
+            wheres=[query_request.where for query_request in unique],
+            where_documents=[query_request.where_document for query_request in unique],
+            ef_searches=[query_request.ef_search for query_request in unique]
+        )
+        
+        responses = dict(zip(first_index, self.generation_executor.map(
+            lambda args: self._respond(args[0], self._rerank(args[0], args[1]), generation),
+            zip(unique, retrieved)
+        )))
+        # Echo each caller's own query text
+        return [
+            responses[key].model_copy(update={"query": query_request.query})
+            for key, query_request in zip(keys, query_requests)
+        ]
+    
+    def _respond(self, query_request: QueryRequest, retrieved_docs: List[Dict[str, Any]], generation: int) -> QueryResponse:
+        """Generate the answer for a query from its retrieved documents."""
         try:
-            # Retrieve relevant documents from knowledge base
-            retrieved_docs = self.knowledge_base.search(
-                query=query_request.query,
-                limit=query_request.top_k
-            )
+            cached_answer = self._cached_answer(query_request.query, retrieved_docs, generation)
             
-            if self.llm_available and self.agent:
-                # Prepare context from retrieved documents
-                context = self._prepare_context(retrieved_docs)
-                
-                # Create prompt with context
-                prompt = f"""Context from knowledge base:
-{context}
-
-Question: {query_request.query}
-
-Please answer the question based on the context provided above."""
+            if cached_answer is not None:
+                answer = cached_answer
+            elif self.llm_available and self.agent:
+                prompt = self._build_prompt(query_request.query, retrieved_docs)
                 
                 # Get response from Agno agent
                 logger.info(f"Processing query with Agno agent: {query_request.query}")
@@ -123,25 +344,17 @@ Please answer the question based on the context provided above."""
                     answer = response.content
                 else:
                     answer = str(response)
+                
+                self._cache_answer(query_request.query, retrieved_docs, answer, generation)
             else:
                 # Fallback response when agent is not available
                 answer = self._fallback_response(query_request.query, retrieved_docs)
             
-            # Format sources
-            sources = [
-                DocumentResponse(
-                    id=doc.get('id', 'unknown'),
-                    content=doc.get('content', ''),
-                    metadata=doc.get('metadata', {}),
-                    score=doc.get('score', 0.0)
-                )
-                for doc in retrieved_docs
-            ]
-            
             return QueryResponse(
                 answer=answer,
-                sources=sources,
-                query=query_request.query
+                sources=self._format_sources(retrieved_docs),
+                query=query_request.query,
+                cached=cached_answer is not None
             )
             
         except Exception as e:
@@ -154,6 +367,118 @@ Please answer the question based on the context provided above."""
                 query=query_request.query
             )
     
+    def query_stream(self, query_request: QueryRequest, cancelled: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """Process a query, yielding events as they become available.
+        
+        Yields a "sources" event right after retrieval, one "token" event
+        per piece of answer text as the agent generates it, and a final
+        "done" event with timings (or an "error" event). Once ``cancelled``
+        is set (the client went away), the generator stops at the next
+        retrieval or token boundary without yielding further events or
+        caching the partial answer.
+        """
+        cancelled = cancelled or threading.Event()
+        start = time.perf_counter()
+        try:
+            generation = self.knowledge_base.generation
+            retrieved_docs = self._retrieve(query_request)
+            retrieval_done = time.perf_counter()
+            if cancelled.is_set():
+                return
+            yield {
+                "event": "sources",
+                "data": {
+                    "query": query_request.query,
+                    "sources": [source.model_dump() for source in self._format_sources(retrieved_docs)]
+                }
+            }
+            
+            cached_answer = self._cached_answer(query_request.query, retrieved_docs, generation)
+            
+            first_token = None
+            if cached_answer is not None:
+                first_token = time.perf_counter()
+                yield {"event": "token", "data": {"text": cached_answer}}
+            elif self.llm_available and self.agent:
+                prompt = self._build_prompt(query_request.query, retrieved_docs)
+                logger.info(f"Streaming query with Agno agent: {query_request.query}")
+                
+                parts = []
+                for chunk in self.agent.run(prompt, stream=True):
+                    if cancelled.is_set():
+                        logger.info(f"Stopped streaming cancelled query: {query_request.query}")
+                        return
+                    text = getattr(chunk, 'content', None)
+                    if not isinstance(text, str) or not text:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    parts.append(text)
+                    yield {"event": "token", "data": {"text": text}}
+                
+                self._cache_answer(query_request.query, retrieved_docs, "".join(parts), generation)
+            else:
+                first_token = time.perf_counter()
+                yield {"event": "token", "data": {"text": self._fallback_response(query_request.query, retrieved_docs)}}
+            
+            end = time.perf_counter()
+            yield {
+                "event": "done",
+                "data": {
+                    "cached": cached_answer is not None,
+                    "timings": {
+                        "retrieval_ms": (retrieval_done - start) * 1000,
+                        "first_token_ms": (first_token - start) * 1000 if first_token is not None else None,
+                        "generation_ms": (end - retrieval_done) * 1000,
+                        "total_ms": (end - start) * 1000
+                    }
+                }
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to stream query: {e}")
+            yield {"event": "error", "data": {"message": str(e)}}
+    
+    def _cached_answer(self, query: str, retrieved_docs: List[Dict[str, Any]], generation: int) -> Optional[str]:
+        """Answer generated earlier for a paraphrase of query over the same chunks, if any."""
+        if self.answer_cache is None or not (self.llm_available and self.agent):
+            return None
+        query_embedding = self.knowledge_base.embed_query(query)
+        return self.answer_cache.get(query_embedding, [doc.get('id') for doc in retrieved_docs], generation)
+    
+    def _cache_answer(self, query: str, retrieved_docs: List[Dict[str, Any]], answer: str, generation: int):
+        """Remember a generated answer for later paraphrases of query."""
+        if self.answer_cache is not None:
+            query_embedding = self.knowledge_base.embed_query(query)
+            self.answer_cache.put(query_embedding, [doc.get('id') for doc in retrieved_docs], answer, generation)
+    
+    def _build_prompt(self, query: str, retrieved_docs: List[Dict[str, Any]]) -> str:
+        """Prompt asking the agent to answer query from the retrieved documents."""
+        # Prepare context from retrieved documents
+        context = self._prepare_context(retrieved_docs)
+        
+        # Create prompt with context
+        return f"""Context from knowledge base:
+{context}
+
+Question: {query}
+
+Please answer the question based on the context provided above."""
+    
+    @staticmethod
+    def _format_sources(retrieved_docs: List[Dict[str, Any]]) -> List[DocumentResponse]:
+        """Retrieved documents as response sources."""
+        return [
+            DocumentResponse(
+                id=doc.get('id', 'unknown'),
+                content=doc.get('content', ''),
+                metadata=doc.get('metadata', {}),
+                score=doc.get('score', 0.0),
+                rrf_score=doc.get('rrf_score')
+            )
+            for doc in retrieved_docs
+        ]
+    
     def _prepare_context(self, context_docs: List[Dict[str, Any]]) -> str:
         """Prepare context string from retrieved documents."""
         if not context_docs:
@@ -200,6 +525,9 @@ Note: This is a simplified response. For better answers, please ensure Ollama is
             return {
                 "knowledge_base": kb_stats,
                 "llm_service": llm_status,
+                "answer_cache": self.answer_cache.get_stats() if self.answer_cache else None,
+                "single_flight": self.single_flight.get_stats() if self.single_flight else None,
+                "reranker": self.reranker.get_stats() if self.reranker else None,
                 "status": "operational"
             }
             
@@ -210,6 +538,14 @@ Note: This is a simplified response. For better answers, please ensure Ollama is
                 "message": str(e)
             }
     
+    def shutdown(self):
+        """Finish queued ingest jobs and release knowledge base resources."""
+        self.ingest_jobs.shutdown(wait=True)
+        self.generation_executor.shutdown(wait=True)
+        if self.reranker is not None:
+            self.reranker.close()
+        self.knowledge_base.close()
+    
     def clear_knowledge_base(self) -> Dict[str, Any]:
         """Clear all documents from the knowledge base."""
         try:
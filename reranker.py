@@ -0,0 +1,181 @@
+"""Cross-encoder reranking of retrieved chunks within a per-request time budget."""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from sentence_transformers import CrossEncoder
+
+from query_batcher import Histogram
+from query_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RERANK_MS_BUCKETS = (5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class CrossEncoderReranker:
+    """Reorders search results by cross-encoder relevance of (query, chunk) pairs.
+    
+    The query is tokenized once per request and its token ids are spliced
+    into every pair next to the chunk's token ids, which are cached by chunk
+    id (ids are content hashes, and the same chunks come back for many
+    queries). All pairs are scored in one forward pass on a pool of CPU
+    worker threads, and the logits go through the model's own activation
+    function, as CrossEncoder.predict applies it. If scoring does not
+    finish within the request's budget, the results are returned in their
+    original retrieval order. A worker that picks up a request whose budget
+    has already run out, or that runs out while its pairs are tokenized,
+    drops it without the forward pass, so one slow request does not leave
+    the ones queued behind it to time out as well.
+    """
+    
+    def __init__(self, model_name: str, max_length: int = 512, token_cache_size: int = 10000, workers: int = 2):
+        """Load the cross-encoder on CPU and start its worker pool."""
+        self.model_name = model_name
+        self.encoder = CrossEncoder(model_name, device="cpu", max_length=max_length)
+        self.tokenizer = self.encoder.tokenizer
+        # activation_fn since sentence-transformers 4; default_activation_function before
+        self._activation = getattr(self.encoder, "activation_fn", None) or getattr(self.encoder, "default_activation_function", torch.sigmoid)
+        self.max_length = max_length
+        self._prefix, self._middle, self._suffix, self._token_types = self._pair_template()
+        self._token_cache = TTLCache(token_cache_size) if token_cache_size > 0 else None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+        self._lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = 0
+        self.errors = 0
+        self.latency_ms = Histogram(RERANK_MS_BUCKETS)
+        
+        logger.info(f"CrossEncoderReranker loaded {model_name}")
+    
+    def _pair_template(self) -> Tuple[List[int], List[int], List[int], Optional[Tuple[int, int]]]:
+        """Special token ids before, between and after a sequence pair, and the pair's token type ids."""
+        encoded = self.tokenizer("a", "b", add_special_tokens=True, return_token_type_ids=True)
+        with_specials = encoded["input_ids"]
+        first = self.tokenizer("a", add_special_tokens=False)["input_ids"]
+        second = self.tokenizer("b", add_special_tokens=False)["input_ids"]
+        for i in range(len(with_specials)):
+            if with_specials[i:i + len(first)] != first:
+                continue
+            for j in range(i + len(first), len(with_specials)):
+                if with_specials[j:j + len(second)] == second:
+                    types = encoded.get("token_type_ids") if "token_type_ids" in self.tokenizer.model_input_names else None
+                    token_types = (types[i], types[j]) if types else None
+                    return with_specials[:i], with_specials[i + len(first):j], with_specials[j + len(second):], token_types
+        return [], [], [], None
+    
+    def _chunk_token_ids(self, results: List[Dict[str, Any]]) -> List[List[int]]:
+        """Token ids of each result's content, without special tokens, served from the cache when possible."""
+        token_ids: List[Optional[List[int]]] = [None] * len(results)
+        if self._token_cache is not None:
+            token_ids = [self._token_cache.get(result['id']) for result in results]
+        
+        missing = [i for i, ids in enumerate(token_ids) if ids is None]
+        if missing:
+            encoded = self.tokenizer(
+                [results[i].get('content') or "" for i in missing],
+                add_special_tokens=False,
+                truncation=True,
+                max_length=self.max_length
+            )["input_ids"]
+            for i, ids in zip(missing, encoded):
+                token_ids[i] = ids
+                if self._token_cache is not None:
+                    self._token_cache.put(results[i]['id'], ids)
+        return token_ids
+    
+    def _score(self, query: str, results: List[Dict[str, Any]], deadline: Optional[float] = None) -> Optional[np.ndarray]:
+        """Relevance score of each result for query, from one batched forward pass.
+        
+        Returns None without running the model once time.perf_counter()
+        has passed deadline, since the caller has stopped waiting.
+        """
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        special = len(self._prefix) + len(self._middle) + len(self._suffix)
+        query_ids = self.tokenizer(
+            query,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=max(1, (self.max_length - special) // 2)
+        )["input_ids"]
+        first = self._prefix + query_ids + self._middle
+        room = self.max_length - len(first) - len(self._suffix)
+        
+        features = {"input_ids": [first + ids[:room] + self._suffix for ids in self._chunk_token_ids(results)]}
+        if self._token_types is not None:
+            first_type, second_type = self._token_types
+            features["token_type_ids"] = [
+                [first_type] * len(first) + [second_type] * (len(input_ids) - len(first))
+                for input_ids in features["input_ids"]
+            ]
+        batch = self.tokenizer.pad(features, return_tensors="pt")
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        
+        model = self.encoder.model
+        with torch.inference_mode():
+            logits = model(**{key: value.to(model.device) for key, value in batch.items()}).logits.float()
+            scores = self._activation(logits)
+        # One relevance score per pair; models with several labels are ranked by the last one
+        return scores[:, -1].cpu().numpy()
+    
+    def rerank(self, query: str, results: List[Dict[str, Any]], top_k: int, budget_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """The top_k results by cross-encoder score, or the first top_k if scoring exceeds budget_ms (0 = no budget).
+        
+        Reranked results carry the cross-encoder score as 'score'.
+        """
+        if len(results) < 2:
+            return results[:top_k]
+        
+        started = time.perf_counter()
+        deadline = started + budget_ms / 1000 if budget_ms > 0 else None
+        future = self._executor.submit(self._score, query, results, deadline)
+        try:
+            scores = future.result(timeout=budget_ms / 1000 if budget_ms > 0 else None)
+        except FutureTimeoutError:
+            scores = None
+        except Exception as e:
+            logger.warning(f"Failed to rerank {len(results)} results, keeping retrieval order: {e}")
+            with self._lock:
+                self.errors += 1
+            return results[:top_k]
+        
+        if scores is None:
+            future.cancel()
+            logger.warning(f"Reranking {len(results)} results exceeded the {budget_ms} ms budget, keeping retrieval order")
+            with self._lock:
+                self.fallbacks += 1
+            return results[:top_k]
+        
+        with self._lock:
+            self.reranked += 1
+            self.latency_ms.observe((time.perf_counter() - started) * 1000)
+        
+        reranked = []
+        for i in np.argsort(-scores, kind="stable")[:top_k]:
+            result = dict(results[i])
+            result['score'] = float(scores[i])
+            reranked.append(result)
+        return reranked
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Reranked and fallen-back request counts, latency histogram and token cache stats."""
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "reranked": self.reranked,
+                "fallbacks": self.fallbacks,
+                "errors": self.errors,
+                "latency_ms": self.latency_ms.snapshot(),
+                "token_cache": self._token_cache.get_stats() if self._token_cache is not None else None
+            }
+    
+    def close(self):
+        """Stop the worker pool after the pairs already submitted."""
+        self._executor.shutdown()
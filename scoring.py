@@ -0,0 +1,10 @@
+"""Similarity scores from vector index distances."""
+
+# Similarity score from a Chroma distance, per HNSW space ("l2" is squared
+# Euclidean; for unit-length embeddings 1 - d/2 is their cosine similarity)
+HNSW_SPACES = ("cosine", "ip", "l2")
+SCORE_FROM_DISTANCE = {
+    "cosine": lambda distance: 1 - distance,
+    "ip": lambda distance: 1 - distance,
+    "l2": lambda distance: 1 - distance / 2
+}
@@ -0,0 +1,85 @@
+"""Validation of Chroma metadata (where) and document (where_document) filters."""
+
+import json
+from typing import Any, Dict, Optional
+
+_LOGICAL = ("$and", "$or")
+_COMPARISON = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte")
+_MEMBERSHIP = ("$in", "$nin")
+_DOCUMENT = ("$contains", "$not_contains", "$regex", "$not_regex")
+_SCALARS = (str, int, float, bool)
+
+
+def _check_logical(operator: str, clauses: Any, validate, path: str):
+    """Check an $and/$or clause list, validating each clause with validate."""
+    if not isinstance(clauses, list) or len(clauses) < 2:
+        raise ValueError(f"{path}.{operator} must be a list of at least two filters")
+    for i, clause in enumerate(clauses):
+        validate(clause, f"{path}.{operator}[{i}]")
+
+
+def _check_where(where: Any, path: str = "where"):
+    """Raise ValueError if where is not a valid Chroma metadata filter."""
+    if not isinstance(where, dict) or len(where) != 1:
+        raise ValueError(f"{path} must be an object with exactly one key")
+    
+    key, value = next(iter(where.items()))
+    if key in _LOGICAL:
+        _check_logical(key, value, _check_where, path)
+        return
+    if key.startswith("$"):
+        raise ValueError(f"{path}: unknown operator {key}")
+    
+    if isinstance(value, _SCALARS):
+        return
+    if not isinstance(value, dict) or len(value) != 1:
+        raise ValueError(f"{path}.{key} must be a string, number, boolean or an object with one operator")
+    operator, operand = next(iter(value.items()))
+    if operator in _COMPARISON:
+        if not isinstance(operand, _SCALARS):
+            raise ValueError(f"{path}.{key}.{operator} must be a string, number or boolean")
+        if operator in ("$gt", "$gte", "$lt", "$lte") and (isinstance(operand, bool) or not isinstance(operand, (int, float))):
+            raise ValueError(f"{path}.{key}.{operator} must be a number")
+    elif operator in _MEMBERSHIP:
+        if not isinstance(operand, list) or not operand or not all(isinstance(item, _SCALARS) for item in operand):
+            raise ValueError(f"{path}.{key}.{operator} must be a non-empty list of strings, numbers or booleans")
+    else:
+        raise ValueError(f"{path}.{key}: unknown operator {operator}")
+
+
+def _check_where_document(where_document: Any, path: str = "where_document"):
+    """Raise ValueError if where_document is not a valid Chroma document filter."""
+    if not isinstance(where_document, dict) or len(where_document) != 1:
+        raise ValueError(f"{path} must be an object with exactly one key")
+    
+    operator, operand = next(iter(where_document.items()))
+    if operator in _LOGICAL:
+        _check_logical(operator, operand, _check_where_document, path)
+    elif operator in _DOCUMENT:
+        if not isinstance(operand, str) or not operand:
+            raise ValueError(f"{path}.{operator} must be a non-empty string")
+    else:
+        raise ValueError(f"{path}: unknown operator {operator}")
+
+
+def validate_where(where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Validated metadata filter, or None for no filter."""
+    if not where:
+        return None
+    _check_where(where)
+    return where
+
+
+def validate_where_document(where_document: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Validated document content filter, or None for no filter."""
+    if not where_document:
+        return None
+    _check_where_document(where_document)
+    return where_document
+
+
+def filter_key(where: Optional[Dict[str, Any]], where_document: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Canonical hashable form of a filter pair, for cache and coalescing keys."""
+    if not where and not where_document:
+        return None
+    return json.dumps([where or None, where_document or None], sort_keys=True)
@@ -0,0 +1,159 @@
+"""Offline tests for the BM25 index and hybrid search in the knowledge base."""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+from bm25_index import BM25Index, tokenize
+
+
+def test_tokenize_keeps_compound_identifiers_and_their_parts():
+    assert tokenize("Got ERR-4012 on v1.2.3") == ["got", "err-4012", "err", "4012", "on", "v1.2.3", "v1", "2", "3"]
+    assert tokenize("SKU/88-B, sku") == ["sku/88-b", "sku", "88", "b", "sku"]
+
+
+def test_search_ranks_matching_chunks_and_skips_known_ids(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    try:
+        index.add(["a", "b", "c"], ["cats and dogs", "error ERR-4012 in the cat flap", "dogs dogs dogs"])
+        index.add(["b", "d"], ["replaced text is ignored", "nothing relevant"])
+        
+        assert len(index) == 4
+        assert [chunk_id for chunk_id, _ in index.search("err-4012", 10)] == ["b"]
+        assert [chunk_id for chunk_id, _ in index.search("dogs", 10)] == ["c", "a"]
+        assert index.search("dogs", 1)[0][0] == "c"
+        assert index.search("zebra", 10) == []
+    finally:
+        index.close()
+
+
+def test_index_survives_reopen(tmp_path):
+    path = str(tmp_path / "bm25.sqlite3")
+    index = BM25Index(path)
+    index.add([f"{i}" for i in range(300)], [f"chunk {i} {'even' if i % 2 == 0 else 'odd'} ERR-{i}" for i in range(300)])
+    before = index.search("odd ERR-7", 20)
+    stats = index.get_stats()
+    index.close()
+    
+    index = BM25Index(path)
+    try:
+        assert index.search("odd ERR-7", 20) == before
+        assert index.get_stats() == stats
+        
+        index.add(["300"], ["ERR-7 again"])
+        assert len(index) == 301
+        assert [chunk_id for chunk_id, _ in index.search("again", 5)] == ["300"]
+        assert {chunk_id for chunk_id, _ in index.search("ERR-7", 2)} == {"300", "7"}
+    finally:
+        index.close()
+
+
+class _HashEmbedder:
+    """Offline stand-in for SentenceTransformer: unit vectors seeded by a hash of the text."""
+    
+    max_seq_length = 128
+    device = "cpu"
+    
+    def __init__(self, model_name, *args, **kwargs):
+        self.tokenizer = _special_tokens_tokenizer()
+        self.calls = 0
+    
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        self.calls += 1
+        single = isinstance(texts, str)
+        vectors = np.stack([_hash_vector(text) for text in ([texts] if single else texts)])
+        return vectors[0] if single else vectors
+
+
+def _hash_vector(text, dim=32):
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _special_tokens_tokenizer():
+    """A whitespace tokenizer that wraps sequences in [CLS] ... [SEP], built without downloads."""
+    tokenizers = pytest.importorskip("tokenizers")
+    transformers = pytest.importorskip("transformers")
+    
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel({"[PAD]": 0, "[UNK]": 1, "[CLS]": 2, "[SEP]": 3}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.WhitespaceSplit()
+    tokenizer.post_processor = tokenizers.processors.TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        special_tokens=[("[CLS]", 2), ("[SEP]", 3)]
+    )
+    return transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token="[PAD]", unk_token="[UNK]", cls_token="[CLS]", sep_token="[SEP]"
+    )
+
+
+@pytest.fixture
+def open_knowledge_base(tmp_path, monkeypatch):
+    """Opens numpy-backed knowledge bases under tmp_path with the offline embedder; closes them afterwards."""
+    agno_knowledge = pytest.importorskip("agno_knowledge")
+    monkeypatch.setattr(agno_knowledge, "SentenceTransformer", _HashEmbedder)
+    opened = []
+    
+    def open_(**kwargs):
+        knowledge_base = agno_knowledge.AgnoRAGKnowledgeBase(path=str(tmp_path / "kb"), vector_backend="numpy", **kwargs)
+        opened.append(knowledge_base)
+        return knowledge_base
+    
+    yield open_
+    for knowledge_base in opened:
+        knowledge_base.close()
+
+
+DOCUMENTS = [f"Note {i} about {'cats' if i % 2 else 'dogs'}." for i in range(40)] + ["Pump failed with ERR-4012 during startup."]
+
+
+def test_bm25_index_is_rebuilt_from_the_collection_on_reopen(open_knowledge_base):
+    knowledge_base = open_knowledge_base()
+    knowledge_base.add_text_documents(DOCUMENTS)
+    knowledge_base.close()
+    
+    # Enabling hybrid search on an existing collection indexes what it already holds
+    knowledge_base = open_knowledge_base(hybrid_search=True, hybrid_candidates=5)
+    assert len(knowledge_base.bm25) == len(DOCUMENTS)
+    assert knowledge_base.search("ERR-4012", limit=3)[0]['content'] == DOCUMENTS[-1]
+    
+    knowledge_base.add_text_documents(["Valve stuck, ERR-5001 logged."])
+    knowledge_base.close()
+    
+    knowledge_base = open_knowledge_base(hybrid_search=True, hybrid_candidates=5)
+    assert len(knowledge_base.bm25) == len(DOCUMENTS) + 1
+    assert knowledge_base.search("ERR-5001", limit=3)[0]['content'] == "Valve stuck, ERR-5001 logged."
+
+
+def test_hybrid_scores_stay_cosine_similarities(open_knowledge_base):
+    knowledge_base = open_knowledge_base(hybrid_search=True, hybrid_candidates=2)
+    knowledge_base.add_text_documents(DOCUMENTS)
+    
+    query = "ERR-4012"
+    results = knowledge_base.search(query, limit=2)
+    query_vector = _hash_vector(query)
+    
+    # The identifier is found lexically, not by its (random) embedding
+    assert DOCUMENTS[-1] in [result['content'] for result in results]
+    assert 'distance' not in next(result for result in results if result['content'] == DOCUMENTS[-1])
+    for result in results:
+        assert result['score'] == pytest.approx(float(_hash_vector(result['content']) @ query_vector), abs=1e-5)
+    rrf_scores = [result['rrf_score'] for result in results]
+    assert rrf_scores == sorted(rrf_scores, reverse=True)
+
+
+def test_retrieval_cache_is_invalidated_by_writes(open_knowledge_base):
+    knowledge_base = open_knowledge_base(hybrid_search=True, hybrid_candidates=5, retrieval_cache_size=100)
+    knowledge_base.add_text_documents(DOCUMENTS)
+    
+    first = knowledge_base.search("ERR-7777", limit=3)
+    calls = knowledge_base.embedder.calls
+    assert knowledge_base.search("ERR-7777", limit=3) == first
+    assert knowledge_base.embedder.calls == calls
+    
+    knowledge_base.add_text_documents(["Sensor raised ERR-7777."])
+    assert knowledge_base.search("ERR-7777", limit=3)[0]['content'] == "Sensor raised ERR-7777."
+    
+    knowledge_base.clear_knowledge_base()
+    assert knowledge_base.search("ERR-7777", limit=3) == []
@@ -0,0 +1,225 @@
+"""Offline tests for chunking: legacy parity, streaming and parallel chunking."""
+
+import random
+
+import numpy as np
+import pytest
+
+from chunking import Chunker, chunk_spans
+
+
+def legacy_chunk_text(text, chunk_size, chunk_overlap):
+    """The original AgnoRAGKnowledgeBase._chunk_text, as the reference output.
+    
+    One deliberate difference: the original loop kept going after the window
+    that reached the end of the text and appended a redundant overlap-only
+    tail chunk; here it stops there, as chunk_spans does.
+    """
+    if len(text) <= chunk_size:
+        return [text]
+    
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end]
+        
+        if end < len(text):
+            last_period = chunk.rfind('.')
+            last_newline = chunk.rfind('\n')
+            break_point = max(last_period, last_newline)
+            if break_point > chunk_size // 2:
+                chunk = chunk[:break_point + 1]
+                end = start + break_point + 1
+        
+        chunks.append(chunk.strip())
+        if end >= len(text):
+            break
+        start = end - chunk_overlap
+    return chunks
+
+
+def random_text(rng, words):
+    """Text of random words, sentence ends, newlines and long unbroken runs."""
+    vocabulary = ["alpha", "beta.", "gamma\n", "delta", "eps.", " ", "ERR-4012", "v1.2.3"]
+    return " ".join(
+        rng.choice(vocabulary) if rng.random() < 0.9 else "x" * rng.randint(1, 40)
+        for _ in range(words)
+    )
+
+
+def make_tokenizer(texts):
+    """A word-level fast tokenizer over the words of texts, built without downloads."""
+    tokenizers = pytest.importorskip("tokenizers")
+    transformers = pytest.importorskip("transformers")
+    
+    vocab = {"[PAD]": 0, "[UNK]": 1}
+    for text in texts:
+        for word in text.split():
+            vocab.setdefault(word, len(vocab))
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.WhitespaceSplit()
+    return transformers.PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="[PAD]", unk_token="[UNK]")
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 200), (200, 40), (100, 0), (50, 10)])
+def test_chunk_spans_match_legacy_chunker(chunk_size, chunk_overlap):
+    rng = random.Random(chunk_size)
+    for _ in range(200):
+        text = random_text(rng, rng.randint(1, 600))
+        expected = [chunk for chunk in legacy_chunk_text(text, chunk_size, chunk_overlap) if chunk]
+        if len(text) <= chunk_size:
+            expected = [text]
+        
+        assert [text[start:end] for start, end in chunk_spans(text, chunk_size, chunk_overlap)] == expected
+
+
+def test_chunk_spans_terminate_with_overlap_larger_than_half():
+    text = "a" * 10_000
+    spans = chunk_spans(text, 100, 99)
+    
+    assert spans[0] == (0, 100)
+    assert spans[-1][1] == len(text)
+    assert all(next_start > start for (start, _), (next_start, _) in zip(spans, spans[1:]))
+
+
+class _RecordingKnowledgeBase:
+    """The parts of AgnoRAGKnowledgeBase that TextStreamIngest uses, recording writes."""
+    
+    def __init__(self, chunker, embedding_batch_size=8):
+        self.chunker = chunker
+        self.embedding_batch_size = embedding_batch_size
+        self.written = []
+    
+    def _chunk_id(self, chunk, metadata, index):
+        return f"{index}:{chunk}"
+    
+    def _existing_ids(self, ids):
+        return set()
+    
+    def _embed_chunks(self, chunks, token_ids):
+        return np.zeros((len(chunks), 4), dtype=np.float32)
+    
+    def _write_chunks(self, ids, embeddings, chunks, metadatas):
+        self.written.extend(zip(chunks, metadatas))
+
+
+def stream_spans(chunker, text, block_size):
+    """(char_start, char_end, chunk) of each chunk when text is streamed in blocks."""
+    agno_knowledge = pytest.importorskip("agno_knowledge")
+    
+    knowledge_base = _RecordingKnowledgeBase(chunker)
+    stream = agno_knowledge.TextStreamIngest(knowledge_base, {"filename": "a.txt"})
+    for start in range(0, len(text), block_size):
+        stream.feed(text[start:start + block_size])
+    assert stream.close() == len(knowledge_base.written)
+    return [(metadata["char_start"], metadata["char_end"], chunk) for chunk, metadata in knowledge_base.written]
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1000, 100_000])
+def test_streaming_matches_batch_spans_characters(block_size):
+    chunker = Chunker("characters", chunk_size=200, chunk_overlap=40)
+    rng = random.Random(block_size)
+    for _ in range(10):
+        text = random_text(rng, rng.randint(50, 800))
+        expected = [(start, end, text[start:end]) for start, end, _ in chunker.chunk_document(text)]
+        
+        assert stream_spans(chunker, text, block_size) == expected
+
+
+@pytest.mark.parametrize("block_size", [5, 64, 1000])
+def test_streaming_matches_batch_spans_tokens(block_size):
+    rng = random.Random(block_size)
+    texts = [random_text(rng, rng.randint(50, 800)) for _ in range(10)]
+    chunker = Chunker("tokens", tokenizer=make_tokenizer(texts), max_tokens=32, overlap_tokens=4)
+    for text in texts:
+        expected = [(start, end, text[start:end]) for start, end, _ in chunker.chunk_document(text)]
+        
+        assert stream_spans(chunker, text, block_size) == expected
+
+
+def test_streaming_cuts_text_without_whitespace():
+    agno_knowledge = pytest.importorskip("agno_knowledge")
+    text = "alpha beta " + "QUJD" * 20_000 + " gamma delta"
+    chunker = Chunker("tokens", tokenizer=make_tokenizer([text]), max_tokens=32, overlap_tokens=4)
+    knowledge_base = _RecordingKnowledgeBase(chunker)
+    stream = agno_knowledge.TextStreamIngest(knowledge_base, {"filename": "a.b64"})
+    
+    largest_buffer = 0
+    for start in range(0, len(text), 256):
+        stream.feed(text[start:start + 256])
+        largest_buffer = max(largest_buffer, len(stream.buffer))
+    stream.close()
+    spans = [(metadata["char_start"], metadata["char_end"]) for _, metadata in knowledge_base.written]
+    
+    # The buffer stays near one window instead of holding the whole run
+    assert largest_buffer <= stream.window_chars + 2 * 256
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    assert all(next_start <= end for (_, end), (next_start, _) in zip(spans, spans[1:]))
+
+
+def test_streaming_keeps_a_record_for_empty_documents():
+    chunker = Chunker("characters", chunk_size=200, chunk_overlap=40)
+    
+    assert stream_spans(chunker, "", 64) == [(0, 0, "")]
+
+
+@pytest.mark.parametrize("mode", ["characters", "tokens"])
+def test_parallel_chunker_matches_serial(mode):
+    from parallel_chunking import ParallelChunker
+    
+    rng = random.Random(0)
+    documents = [random_text(rng, rng.randint(0, 2000)) for _ in range(40)] + ["", "é" * 500, "naïve café. " * 300]
+    if mode == "tokens":
+        chunker = Chunker("tokens", tokenizer=make_tokenizer(documents), max_tokens=64, overlap_tokens=8)
+    else:
+        chunker = Chunker("characters", chunk_size=300, chunk_overlap=50)
+    
+    parallel = ParallelChunker(chunker, max_workers=2, task_bytes=4096)
+    try:
+        results = list(parallel.chunk_documents(documents))
+    finally:
+        parallel.shutdown()
+    
+    assert results == [chunker.chunk_document(document) for document in documents]
+
+
+def test_parallel_chunker_frees_shared_memory_when_closed_early(monkeypatch):
+    from multiprocessing import shared_memory
+    import parallel_chunking
+    
+    created = []
+    
+    class RecordingSharedMemory(shared_memory.SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if kwargs.get("create"):
+                created.append(self.name)
+    
+    monkeypatch.setattr(parallel_chunking.shared_memory, "SharedMemory", RecordingSharedMemory)
+    chunker = Chunker("characters", chunk_size=300, chunk_overlap=50)
+    parallel = parallel_chunking.ParallelChunker(chunker, max_workers=2, task_bytes=1024)
+    try:
+        results = parallel.chunk_documents(["naïve café. " * 300] * 20)
+        assert next(results) == chunker.chunk_document("naïve café. " * 300)
+        results.close()
+    finally:
+        parallel.shutdown()
+    
+    monkeypatch.undo()
+    assert len(created) == 1
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=created[0])
+
+
+def test_parallel_chunker_starts_one_pool_for_concurrent_callers():
+    from concurrent.futures import ThreadPoolExecutor
+    from parallel_chunking import ParallelChunker
+    
+    parallel = ParallelChunker(Chunker("characters", chunk_size=300, chunk_overlap=50), max_workers=1)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as callers:
+            executors = list(callers.map(lambda _: parallel._get_executor(), range(8)))
+        assert all(executor is executors[0] for executor in executors)
+    finally:
+        parallel.shutdown()
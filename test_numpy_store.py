@@ -0,0 +1,233 @@
+"""Offline tests for NumpyVectorStore search, filters and persistence."""
+
+import numpy as np
+import pytest
+
+from numpy_store import NumpyVectorStore
+
+
+def clustered_vectors(count, dim=32, clusters=8, seed=0):
+    """Gaussian clusters, so nearest neighbours are well separated from the rest."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    return centers[rng.integers(0, clusters, count)] + 0.3 * rng.standard_normal((count, dim)).astype(np.float32)
+
+
+def brute_force_top(vectors, queries, k, rows=None):
+    """Ids and cosine similarities of each query's top k, computed directly."""
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    candidates = np.arange(len(vectors)) if rows is None else np.asarray(rows)
+    scores = unit_queries @ unit[candidates].T
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return (
+        [[str(candidates[i]) for i in selected] for selected in order],
+        [scores[q, selected] for q, selected in enumerate(order)]
+    )
+
+
+def fill(store, vectors, batch_size=100):
+    """Add vectors under ids "0".."n-1" in several batches, with metadata and text."""
+    for start in range(0, len(vectors), batch_size):
+        end = min(start + batch_size, len(vectors))
+        store.add(
+            [str(i) for i in range(start, end)],
+            vectors[start:end],
+            documents=[f"chunk {i} {'even' if i % 2 == 0 else 'odd'}" for i in range(start, end)],
+            metadatas=[{"n": i, "parity": i % 2} for i in range(start, end)]
+        )
+
+
+@pytest.fixture
+def vectors():
+    return clustered_vectors(1000)
+
+
+def nearby_queries(vectors, count=20, seed=1):
+    """Queries drawn from the same clusters as vectors: perturbed copies of some of them."""
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), count, replace=False)]
+    return picked + 0.3 * rng.standard_normal(picked.shape).astype(np.float32)
+
+
+@pytest.fixture
+def queries(vectors):
+    return nearby_queries(vectors)
+
+
+def test_exact_search_matches_brute_force(tmp_path, vectors, queries):
+    store = NumpyVectorStore(str(tmp_path / "store"), initial_capacity=64)
+    try:
+        fill(store, vectors)
+        result = store.query(queries, n_results=10)
+    finally:
+        store.close()
+    
+    expected_ids, expected_scores = brute_force_top(vectors, queries, 10)
+    assert result["ids"] == expected_ids
+    for distances, scores in zip(result["distances"], expected_scores):
+        np.testing.assert_allclose(1 - np.array(distances), scores, atol=1e-5)
+    assert result["documents"][0][0] == f"chunk {expected_ids[0][0]} {'even' if int(expected_ids[0][0]) % 2 == 0 else 'odd'}"
+    assert result["metadatas"][0][0]["n"] == int(expected_ids[0][0])
+
+
+def test_filtered_search_matches_brute_force_over_matching_rows(tmp_path, vectors, queries):
+    store = NumpyVectorStore(str(tmp_path / "store"))
+    try:
+        fill(store, vectors)
+        by_metadata = store.query(queries, n_results=5, where={"$and": [{"parity": 1}, {"n": {"$gte": 500}}]}, include=[])
+        by_document = store.query(queries, n_results=5, where_document={"$contains": "even"}, include=[])
+    finally:
+        store.close()
+    
+    assert by_metadata["ids"] == brute_force_top(vectors, queries, 5, rows=range(501, 1000, 2))[0]
+    assert by_document["ids"] == brute_force_top(vectors, queries, 5, rows=range(0, 1000, 2))[0]
+
+
+def test_duplicate_ids_are_ignored(tmp_path, vectors):
+    store = NumpyVectorStore(str(tmp_path / "store"))
+    try:
+        fill(store, vectors[:10])
+        store.add(["0", "10", "10"], vectors[:3])
+        
+        assert store.count() == 11
+        assert store.get(ids=["10"], include=["documents"])["documents"] == [None]
+    finally:
+        store.close()
+
+
+def test_reopen_keeps_vectors_and_results(tmp_path, vectors, queries):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, initial_capacity=64)
+    fill(store, vectors[:700])
+    before = store.query(queries, n_results=10, include=["distances"])
+    store.close()
+    
+    store = NumpyVectorStore(path, initial_capacity=64)
+    try:
+        assert store.count() == 700
+        assert store.query(queries, n_results=10, include=["distances"]) == before
+        
+        fill(store, vectors)
+        assert store.count() == 1000
+        assert store.query(queries, n_results=10, include=[])["ids"] == brute_force_top(vectors, queries, 10)[0]
+    finally:
+        store.close()
+
+
+def test_store_cannot_be_opened_by_two_writers(tmp_path):
+    pytest.importorskip("fcntl")
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path)
+    try:
+        with pytest.raises(RuntimeError):
+            NumpyVectorStore(path)
+        NumpyVectorStore(path, read_only=True).close()
+    finally:
+        store.close()
+    
+    NumpyVectorStore(path).close()
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_reader_follows_the_writer(tmp_path, vectors, queries, quantization):
+    path = str(tmp_path / "store")
+    writer = NumpyVectorStore(path, initial_capacity=64, quantization=quantization, oversample=len(vectors))
+    reader = NumpyVectorStore(path, quantization=quantization, oversample=len(vectors), read_only=True)
+    try:
+        assert reader.count() == 0
+        assert reader.query(queries[:1], n_results=3)["ids"] == [[]]
+        
+        # Growing past the initial capacity replaces the .npy files the reader has mapped
+        fill(writer, vectors[:50])
+        assert reader.count() == 50
+        fill(writer, vectors)
+        assert reader.count() == len(vectors)
+        assert reader.query(queries, n_results=10, include=[])["ids"] == brute_force_top(vectors, queries, 10)[0]
+        assert reader.get(ids=["999"])["documents"] == ["chunk 999 odd"]
+        
+        with pytest.raises(RuntimeError):
+            reader.add(["x"], vectors[:1])
+        with pytest.raises(RuntimeError):
+            reader.clear()
+        
+        writer.clear()
+        assert reader.count() == 0
+        assert reader.query(queries[:1], n_results=3)["ids"] == [[]]
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_get_pages_through_filtered_records(tmp_path, vectors):
+    store = NumpyVectorStore(str(tmp_path / "store"))
+    try:
+        fill(store, vectors[:50])
+        page = store.get(where={"parity": 0}, limit=5, offset=5, include=["metadatas"])
+    finally:
+        store.close()
+    
+    assert page["ids"] == ["10", "12", "14", "16", "18"]
+    assert [metadata["n"] for metadata in page["metadatas"]] == [10, 12, 14, 16, 18]
+
+
+def recall(found, truth):
+    """Mean fraction of each query's true top k that was found."""
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, truth)]))
+
+
+@pytest.mark.parametrize("quantization,oversample,min_recall", [("int8", 8, 0.95), ("binary", 32, 0.9)])
+def test_quantized_search_recall_against_brute_force(tmp_path, quantization, oversample, min_recall):
+    # Embedding-like width: sign bits of 32 dimensions are too coarse to shortlist with
+    vectors = clustered_vectors(1000, dim=256)
+    queries = nearby_queries(vectors)
+    store = NumpyVectorStore(str(tmp_path / "store"), initial_capacity=64, quantization=quantization, oversample=oversample)
+    try:
+        fill(store, vectors)
+        result = store.query(queries, n_results=10, include=["distances"])
+    finally:
+        store.close()
+    
+    expected_ids, _ = brute_force_top(vectors, queries, 10)
+    assert recall(result["ids"], expected_ids) >= min_recall
+    
+    # Whatever was found is rescored exactly and ranked by the exact score
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    for query, ids, distances in zip(unit_queries, result["ids"], result["distances"]):
+        exact = unit[[int(chunk_id) for chunk_id in ids]] @ query
+        np.testing.assert_allclose(1 - np.array(distances), exact, atol=1e-5)
+        assert list(distances) == sorted(distances)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_search_is_exact_when_the_shortlist_covers_everything(tmp_path, vectors, queries, quantization):
+    store = NumpyVectorStore(str(tmp_path / "store"), quantization=quantization, oversample=len(vectors))
+    try:
+        fill(store, vectors)
+        result = store.query(queries, n_results=10, where={"parity": 0}, include=[])
+    finally:
+        store.close()
+    
+    assert result["ids"] == brute_force_top(vectors, queries, 10, rows=range(0, 1000, 2))[0]
+
+
+def test_quantized_codes_survive_reopen_and_mode_changes(tmp_path, vectors, queries):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, initial_capacity=64, quantization="int8")
+    fill(store, vectors[:300])
+    before = store.query(queries, n_results=10, include=["distances"])
+    store.close()
+    
+    store = NumpyVectorStore(path, initial_capacity=64, quantization="int8")
+    try:
+        assert store.query(queries, n_results=10, include=["distances"]) == before
+    finally:
+        store.close()
+    
+    # Opening in another mode builds that mode's codes from the float matrix
+    store = NumpyVectorStore(path, quantization="binary", oversample=300)
+    try:
+        assert store.query(queries, n_results=10, include=[])["ids"] == brute_force_top(vectors[:300], queries, 10)[0]
+    finally:
+        store.close()
@@ -0,0 +1,105 @@
+"""Offline tests for where / where_document filter validation."""
+
+import pytest
+
+from search_filters import filter_key, validate_where, validate_where_document
+
+
+@pytest.mark.parametrize("where", [
+    {"source": "a.txt"},
+    {"n": 3},
+    {"score": 0.5},
+    {"draft": False},
+    {"n": {"$eq": 3}},
+    {"source": {"$ne": "a.txt"}},
+    {"n": {"$gte": 3}},
+    {"n": {"$lt": 2.5}},
+    {"source": {"$in": ["a.txt", "b.txt"]}},
+    {"n": {"$nin": [1, 2]}},
+    {"$and": [{"source": "a.txt"}, {"n": {"$gt": 1}}]},
+    {"$or": [{"source": "a.txt"}, {"$and": [{"n": 1}, {"draft": True}]}]},
+])
+def test_valid_where_is_returned_unchanged(where):
+    assert validate_where(where) == where
+
+
+@pytest.mark.parametrize("where", [
+    {"source": "a.txt", "n": 3},
+    {"$and": [{"source": "a.txt"}]},
+    {"$and": {"source": "a.txt"}},
+    {"$or": []},
+    {"$not": {"source": "a.txt"}},
+    {"source": None},
+    {"source": ["a.txt"]},
+    {"n": {"$gte": "3"}},
+    {"n": {"$lt": True}},
+    {"n": {"$eq": [1]}},
+    {"n": {"$gt": 1, "$lt": 5}},
+    {"n": {"$between": [1, 5]}},
+    {"source": {"$in": []}},
+    {"source": {"$in": "a.txt"}},
+    {"source": {"$nin": [{"a": 1}]}},
+    {"$and": [{"source": "a.txt"}, {"n": {"$gte": "x"}}]},
+    ["source", "a.txt"],
+])
+def test_invalid_where_is_rejected(where):
+    with pytest.raises(ValueError):
+        validate_where(where)
+
+
+@pytest.mark.parametrize("where_document", [
+    {"$contains": "ERR-4012"},
+    {"$not_contains": "draft"},
+    {"$regex": "^Chapter [0-9]+"},
+    {"$not_regex": "TODO"},
+    {"$and": [{"$contains": "cats"}, {"$not_contains": "dogs"}]},
+    {"$or": [{"$contains": "cats"}, {"$and": [{"$contains": "a"}, {"$contains": "b"}]}]},
+])
+def test_valid_where_document_is_returned_unchanged(where_document):
+    assert validate_where_document(where_document) == where_document
+
+
+@pytest.mark.parametrize("where_document", [
+    {"$contains": ""},
+    {"$contains": 4012},
+    {"$contains": "a", "$not_contains": "b"},
+    {"$startswith": "a"},
+    {"$and": [{"$contains": "a"}]},
+    {"$or": [{"$contains": "a"}, {"source": "a.txt"}]},
+    {"source": "a.txt"},
+    "cats",
+])
+def test_invalid_where_document_is_rejected(where_document):
+    with pytest.raises(ValueError):
+        validate_where_document(where_document)
+
+
+def test_empty_filters_mean_no_filter():
+    assert validate_where(None) is None
+    assert validate_where({}) is None
+    assert validate_where_document(None) is None
+    assert validate_where_document({}) is None
+    assert filter_key(None, None) is None
+    assert filter_key({}, {}) is None
+
+
+def test_filter_key_is_canonical():
+    a = {"$and": [{"source": "a.txt"}, {"n": {"$gte": 3}}]}
+    b = {"$and": [{"source": "a.txt"}, {"n": {"$gte": 3}}]}
+    
+    assert filter_key(a, None) == filter_key(b, {})
+    assert filter_key({"x": 1, "y": 2}, None) == filter_key({"y": 2, "x": 1}, None)
+    assert filter_key(a, None) != filter_key(None, {"$contains": "a"})
+    assert filter_key({"source": "a.txt"}, None) != filter_key(None, {"source": "a.txt"})
+
+
+def test_request_models_reject_invalid_filters():
+    pydantic = pytest.importorskip("pydantic")
+    from models import QueryRequest, SearchRequest
+    
+    assert QueryRequest(query="q", where={"n": {"$gte": 3}}).where == {"n": {"$gte": 3}}
+    assert SearchRequest(query="q", where_document={"$contains": "x"}).where_document == {"$contains": "x"}
+    with pytest.raises(pydantic.ValidationError):
+        QueryRequest(query="q", where={"n": {"$gte": "3"}})
+    with pytest.raises(pydantic.ValidationError):
+        SearchRequest(query="q", where_document={"$startswith": "x"})
@@ -6,12 +6,27 @@ from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from typing import List, Dict, Any
-import uuid
+import hashlib
+import json
 import logging
 from config import settings
+from scoring import SCORE_FROM_DISTANCE
 
 logger = logging.getLogger(__name__)
 
+
+def _hnsw_configuration() -> Dict[str, Any]:
+    """Chroma collection configuration for the HNSW settings in config."""
+    return {
+        "hnsw": {
+            "space": settings.HNSW_SPACE,
+            "max_neighbors": settings.HNSW_M,
+            "ef_construction": settings.HNSW_EF_CONSTRUCTION,
+            "ef_search": settings.HNSW_EF_SEARCH,
+            "sync_threshold": settings.HNSW_SYNC_THRESHOLD
+        }
+    }
+
 class VectorStore:
     """ChromaDB vector store for document storage and retrieval."""
     
@@ -34,7 +49,8 @@ class VectorStore:
             
             # Get or create collection
             self.collection = self.client.get_or_create_collection(
-                name=settings.CHROMA_COLLECTION_NAME
+                name=settings.CHROMA_COLLECTION_NAME,
+                configuration=_hnsw_configuration()
             )
             
             # Initialize embeddings
@@ -55,6 +71,16 @@ class VectorStore:
             logger.error(f"Failed to initialize vector store: {e}")
             raise
     
+    def _chunk_id(self, chunk: str, metadata: Dict[str, Any], index: int) -> str:
+        """Chunk id from the document metadata, chunk index and text, model and chunking parameters.
+        
+        The same document re-ingested maps onto the same ids; identical text in
+        another document gets its own id and metadata.
+        """
+        document_key = json.dumps(metadata, sort_keys=True, default=str)
+        key = f"{settings.EMBEDDING_MODEL}\0{settings.CHUNK_SIZE}\0{settings.CHUNK_OVERLAP}\0{document_key}\0{index}\0{chunk}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+    
     def add_documents(self, documents: List[str], metadatas: List[Dict[str, Any]] = None) -> List[str]:
         """Add documents to the vector store."""
         try:
@@ -70,7 +96,7 @@ class VectorStore:
                 chunks = self.text_splitter.split_text(doc_content)
                 
                 for i, chunk in enumerate(chunks):
-                    chunk_id = str(uuid.uuid4())
+                    chunk_id = self._chunk_id(chunk, metadata, i)
                     chunk_metadata = {
                         **metadata,
                         "chunk_index": i,
@@ -82,18 +108,29 @@ class VectorStore:
                     all_metadatas.append(chunk_metadata)
                     all_ids.append(chunk_id)
             
-            # Generate embeddings
-            embeddings = self.embeddings.embed_documents(all_chunks)
-            
-            # Add to ChromaDB
-            self.collection.add(
-                embeddings=embeddings,
-                documents=all_chunks,
-                metadatas=all_metadatas,
-                ids=all_ids
-            )
+            # Skip chunks that are already stored or repeated in this batch
+            seen = set(self.collection.get(ids=list(dict.fromkeys(all_ids)), include=[])["ids"]) if all_ids else set()
+            new = []
+            for i, chunk_id in enumerate(all_ids):
+                if chunk_id not in seen:
+                    seen.add(chunk_id)
+                    new.append(i)
             
-            logger.info(f"Added {len(all_chunks)} chunks from {len(documents)} documents")
+            if new:
+                new_chunks = [all_chunks[i] for i in new]
+                
+                # Generate embeddings
+                embeddings = self.embeddings.embed_documents(new_chunks)
+                
+                # Add to ChromaDB
+                self.collection.add(
+                    embeddings=embeddings,
+                    documents=new_chunks,
+                    metadatas=[all_metadatas[i] for i in new],
+                    ids=[all_ids[i] for i in new]
+                )
+            
+            logger.info(f"Added {len(new)} new chunks ({len(all_ids) - len(new)} already present) from {len(documents)} documents")
             return all_ids
             
         except Exception as e:
@@ -115,14 +152,17 @@ class VectorStore:
                 n_results=top_k
             )
             
-            # Format results
+            # Format results, scoring by the collection's distance space
+            space = ((self.collection.configuration or {}).get("hnsw") or {}).get("space", "l2")
+            score = SCORE_FROM_DISTANCE[space]
             formatted_results = []
             for i in range(len(results['ids'][0])):
+                distance = results['distances'][0][i]
                 result = {
                     'id': results['ids'][0][i],
                     'content': results['documents'][0][i],
                     'metadata': results['metadatas'][0][i],
-                    'score': 1 - results['distances'][0][i]  # Convert distance to similarity
+                    'score': score(distance)  # Convert distance to similarity
                 }
                 formatted_results.append(result)
             
@@ -149,7 +189,10 @@ class VectorStore:
         """Clear all documents from the collection."""
         try:
             self.client.delete_collection(settings.CHROMA_COLLECTION_NAME)
-            self.collection = self.client.create_collection(settings.CHROMA_COLLECTION_NAME)
+            self.collection = self.client.create_collection(
+                settings.CHROMA_COLLECTION_NAME,
+                configuration=_hnsw_configuration()
+            )
             logger.info("Collection cleared successfully")
         except Exception as e:
             logger.error(f"Failed to clear collection: {e}")